@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+# File: catalog.py
+# In-memory catalog of teams.json + data/players.json for spins: compact
+# __slots__ records with interned strings, row indexes per league, club,
+# position and nationality, and alias tables (Walker/Vose) for O(1)
+# weighted draws.
+"""
+Catalog and spins.
+
+    cat = load_catalog()
+    cat.spin_team(league="EPL")
+    cat.spin_player(league="EPL", position="Midfielder")
+    cat.spin_players(1_000_000, nationality="England")    # bulk, vectorized with NumPy
+
+Filters: league (league_code), club_id (Sportmonks id), position,
+nationality; position and nationality match case-insensitively. Players are
+joined to teams.json through club_id (SPORTMONKS_CLUBS), and players whose
+club is not in teams.json count as EPL, like the site and data_bundles.py.
+
+Weights default to uniform; pass weight=callable(record) -> float for
+anything else. One alias table is built per (filters, weight) the first time
+it is needed and kept, so every later draw costs two random numbers; the
+MAX_SAMPLERS most recently used tables are kept, so pass the same function
+(not a new lambda per call) to reuse one. Every draw takes rng as a
+random.Random (or the random module) or an int seed; bulk draws seed a NumPy
+generator from it.
+
+Example:
+python3 catalog.py --spin player --league EPL --position attacker --n 5
+python3 catalog.py --bench 1000000
+"""
+from array import array
+from collections import OrderedDict
+import argparse
+import random
+import sys
+import threading
+import time
+
+try:
+    import numpy as np
+except ImportError:  # bulk draws fall back to a Python loop
+    np = None
+
+from data_bundles import SPORTMONKS_CLUBS, ClubIndex
+from jsonstream import iter_records
+
+TEAMS_JSON = "teams.json"
+PLAYERS_JSON = "data/players.json"
+MAX_SAMPLERS = 256
+
+def _rng(rng):
+    # random.Random / the random module as given; None or an int seed -> a random.Random
+    if rng is None:
+        return random
+    if isinstance(rng, int):
+        return random.Random(rng)
+    return rng
+
+def _s(value):
+    # stripped, interned string (names carry stray NBSPs in players.json)
+    value = str(value or "").strip()
+    return sys.intern(value) if value else None
+
+def _k(value):
+    # index key for case-insensitive filters
+    return sys.intern(str(value).strip().casefold()) if value is not None else None
+
+class Team:
+    __slots__ = ("row", "league_code", "team_name", "club_id", "primary_color", "logo_url", "stadium")
+
+    def __init__(self, row, rec, club_id=None):
+        self.row = row
+        self.league_code = _s((rec.get("league_code") or "").upper())
+        self.team_name = _s(rec.get("team_name"))
+        self.club_id = club_id
+        self.primary_color = _s(rec.get("primary_color"))
+        self.logo_url = rec.get("logo_url") or None
+        self.stadium = _s(rec.get("stadium"))
+
+    def to_dict(self):
+        return {k: getattr(self, k) for k in self.__slots__ if k != "row"}
+
+    def __repr__(self):
+        return f"Team({self.league_code}:{self.team_name})"
+
+class Player:
+    __slots__ = ("row", "player_id", "name", "club_id", "team_name", "league_code", "position", "nationality",
+                 "jersey_number", "image_url")
+
+    def __init__(self, row, rec, team_name=None, league_code=None):
+        self.row = row
+        self.player_id = rec.get("player_id")
+        self.name = _s(rec.get("name") or rec.get("player_name"))
+        self.club_id = rec.get("club_id") or rec.get("team_id")
+        self.team_name = _s(team_name)
+        self.league_code = _s(league_code)
+        self.position = _s(rec.get("position"))
+        self.nationality = _s(rec.get("nationality"))
+        self.jersey_number = rec.get("jersey_number")
+        self.image_url = rec.get("image_url") or None
+
+    def to_dict(self):
+        return {k: getattr(self, k) for k in self.__slots__ if k != "row"}
+
+    def __repr__(self):
+        return f"Player({self.name}, {self.team_name})"
+
+class AliasTable:
+    """Alias method over row ids: O(n) to build, O(1) per draw."""
+
+    __slots__ = ("rows", "prob", "alias", "_np")
+
+    def __init__(self, rows, weights=None):
+        n = len(rows)
+        self.rows = array("I", rows)
+        self.prob = array("d", [1.0]) * n
+        self.alias = array("I", range(n))
+        self._np = None
+        if not n or weights is None:
+            return
+        total = float(sum(weights))
+        if total <= 0:
+            raise ValueError("weights must have a positive sum")
+        scaled = [w * n / total for w in weights]
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+        while small and large:
+            s, l = small.pop(), large.pop()
+            self.prob[s], self.alias[s] = scaled[s], l
+            scaled[l] -= 1.0 - scaled[s]
+            (small if scaled[l] < 1.0 else large).append(l)
+        for i in small + large:  # leftovers are 1 up to rounding
+            self.prob[i] = 1.0
+
+    def __len__(self):
+        return len(self.rows)
+
+    def draw(self, rng=random):
+        # -> row id, or None for an empty table
+        n = len(self.rows)
+        if not n:
+            return None
+        rng = _rng(rng)
+        i = int(rng.random() * n)
+        return self.rows[i] if rng.random() < self.prob[i] else self.rows[self.alias[i]]
+
+    def draws(self, k, rng=None):
+        # -> k row ids (a NumPy array when NumPy is available, else a list)
+        n = len(self.rows)
+        if not n or k <= 0:
+            return []
+        rng = _rng(rng)
+        if np is None:
+            return [self.draw(rng) for _ in range(k)]
+        if self._np is None:
+            self._np = (np.frombuffer(self.rows, dtype=np.uint32), np.frombuffer(self.prob, dtype=np.float64),
+                        np.frombuffer(self.alias, dtype=np.uint32))
+        rows, prob, alias = self._np
+        rng = np.random.default_rng(rng.getrandbits(128))  # same rng type with or without NumPy
+        cols = rng.integers(0, n, size=k)
+        return rows[np.where(rng.random(k) < prob[cols], cols, alias[cols])]
+
+class Catalog:
+    """Teams and players held once, indexed for filtered weighted spins."""
+
+    def __init__(self, teams, players):
+        clubs = ClubIndex(teams)
+        self.teams = [Team(i, t, clubs.club_id(t.get("team_name"))) for i, t in enumerate(t for t in teams if t.get("team_name"))]
+        self.players = []
+        for p in players:
+            cid = p.get("club_id") or p.get("team_id")
+            team = clubs.team(cid)
+            self.players.append(Player(len(self.players), p, team["team_name"] if team else SPORTMONKS_CLUBS.get(cid),
+                                       clubs.league(cid)))
+
+        self._team_index = {"league": self._index(self.teams, lambda t: t.league_code),
+                            "club_id": self._index(self.teams, lambda t: t.club_id)}
+        self._player_index = {"league": self._index(self.players, lambda p: p.league_code),
+                              "club_id": self._index(self.players, lambda p: p.club_id),
+                              "position": self._index(self.players, lambda p: _k(p.position)),
+                              "nationality": self._index(self.players, lambda p: _k(p.nationality))}
+        self._tables = OrderedDict()  # (kind, filters, weight) -> AliasTable, least recently used first
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_files(cls, teams_json=TEAMS_JSON, players_json=PLAYERS_JSON):
+        return cls(list(iter_records(teams_json)), list(iter_records(players_json)) if players_json else [])
+
+    @staticmethod
+    def _index(records, key):
+        index = {}
+        for r in records:
+            k = key(r)
+            if k is not None:
+                index.setdefault(k, array("I")).append(r.row)
+        return index
+
+    @staticmethod
+    def _filters(league=None, club_id=None, position=None, nationality=None):
+        # normalized (field, key) pairs, None filters dropped
+        out = []
+        if league:
+            out.append(("league", league.upper()))
+        if club_id is not None:
+            out.append(("club_id", int(club_id)))
+        if position:
+            out.append(("position", _k(position)))
+        if nationality:
+            out.append(("nationality", _k(nationality)))
+        return tuple(out)
+
+    def _rows(self, index, filters, total):
+        # intersect the filters' row lists, starting from the shortest
+        if not filters:
+            return array("I", range(total))
+        lists = sorted((index[f].get(k, array("I")) for f, k in filters), key=len)
+        rows = lists[0]
+        for other in lists[1:]:
+            keep = set(other)
+            rows = array("I", (r for r in rows if r in keep))
+        return rows
+
+    def team_rows(self, league=None, club_id=None):
+        return self._rows(self._team_index, self._filters(league, club_id), len(self.teams))
+
+    def player_rows(self, league=None, club_id=None, position=None, nationality=None):
+        return self._rows(self._player_index, self._filters(league, club_id, position, nationality), len(self.players))
+
+    def find_teams(self, league=None, club_id=None):
+        return [self.teams[r] for r in self.team_rows(league, club_id)]
+
+    def find_players(self, league=None, club_id=None, position=None, nationality=None):
+        return [self.players[r] for r in self.player_rows(league, club_id, position, nationality)]
+
+    def _table(self, kind, filters, weight):
+        key = (kind, filters, weight)
+        with self._lock:
+            table = self._tables.get(key)
+            if table is not None:
+                self._tables.move_to_end(key)
+                return table
+        records, index = (self.teams, self._team_index) if kind == "team" else (self.players, self._player_index)
+        rows = self._rows(index, filters, len(records))
+        weights = [float(weight(records[r])) for r in rows] if weight else None
+        table = AliasTable(rows, weights)
+        with self._lock:
+            table = self._tables.setdefault(key, table)
+            self._tables.move_to_end(key)
+            while len(self._tables) > MAX_SAMPLERS:
+                self._tables.popitem(last=False)
+        return table
+
+    def team_sampler(self, league=None, club_id=None, weight=None):
+        return self._table("team", self._filters(league, club_id), weight)
+
+    def player_sampler(self, league=None, club_id=None, position=None, nationality=None, weight=None):
+        return self._table("player", self._filters(league, club_id, position, nationality), weight)
+
+    def spin_team(self, league=None, club_id=None, weight=None, rng=random):
+        row = self.team_sampler(league, club_id, weight).draw(rng)
+        return None if row is None else self.teams[row]
+
+    def spin_player(self, league=None, club_id=None, position=None, nationality=None, weight=None, rng=random):
+        row = self.player_sampler(league, club_id, position, nationality, weight).draw(rng)
+        return None if row is None else self.players[row]
+
+    def spin_teams(self, n, league=None, club_id=None, weight=None, rng=None):
+        teams = self.teams
+        return [teams[r] for r in _as_list(self.team_sampler(league, club_id, weight).draws(n, rng))]
+
+    def spin_players(self, n, league=None, club_id=None, position=None, nationality=None, weight=None, rng=None):
+        players = self.players
+        return [players[r] for r in _as_list(self.player_sampler(league, club_id, position, nationality, weight).draws(n, rng))]
+
+    def stats(self):
+        return {"teams": len(self.teams), "players": len(self.players), "leagues": len(self._team_index["league"]),
+                "samplers": len(self._tables)}
+
+def _as_list(rows):
+    return rows.tolist() if hasattr(rows, "tolist") else rows
+
+def load_catalog(teams_json=TEAMS_JSON, players_json=PLAYERS_JSON):
+    return Catalog.from_files(teams_json, players_json)
+
+def main():
+    parser = argparse.ArgumentParser(description="Filtered weighted spins over teams.json and players.json")
+    parser.add_argument("--teams-json", default=TEAMS_JSON)
+    parser.add_argument("--players-json", default=PLAYERS_JSON)
+    parser.add_argument("--spin", choices=["team", "player"], default="player", help="What to draw")
+    parser.add_argument("--league", help="league_code filter")
+    parser.add_argument("--club-id", type=int, help="Sportmonks club id filter")
+    parser.add_argument("--position", help="Player position filter (e.g. Attacker)")
+    parser.add_argument("--nationality", help="Player nationality filter")
+    parser.add_argument("--n", type=int, default=1, help="Number of spins")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--bench", type=int, default=0, help="Time this many draws (single and bulk) instead of printing spins")
+    args = parser.parse_args()
+
+    t = time.perf_counter()
+    cat = load_catalog(args.teams_json, args.players_json)
+    print(f"Catalog: {cat.stats()['teams']} teams, {cat.stats()['players']} players, loaded in {time.perf_counter() - t:.3f}s")
+    if args.spin == "team":
+        sampler = cat.team_sampler(args.league, args.club_id)
+        records = cat.teams
+    else:
+        sampler = cat.player_sampler(args.league, args.club_id, args.position, args.nationality)
+        records = cat.players
+    print(f"Candidates: {len(sampler)}")
+    if args.bench:
+        rng = random.Random(args.seed)
+        t = time.perf_counter()
+        for _ in range(args.bench):
+            sampler.draw(rng)
+        single = time.perf_counter() - t
+        t = time.perf_counter()
+        sampler.draws(args.bench, random.Random(args.seed))
+        bulk = time.perf_counter() - t
+        print(f"{args.bench} single draws: {single:.3f}s ({args.bench / single:,.0f}/s)")
+        print(f"{args.bench} bulk draws: {bulk:.3f}s ({args.bench / bulk:,.0f}/s{'' if np is not None else ', no NumPy'})")
+        return
+    rng = random.Random(args.seed)
+    for _ in range(args.n):
+        row = sampler.draw(rng)
+        print(records[row].to_dict() if row is not None else None)
+
+if __name__ == "__main__":
+    main()
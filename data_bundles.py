@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+# File: data_bundles.py
+# Compiles teams.json + data/players.json into minified per-league shards with
+# content-hashed names and a small index, and loads them back lazily.
+"""
+Build / load data bundles.
+
+Output (default data/bundles/):
+  index.json                   leagues -> shard files, club names, counts
+  teams.<CODE>.<hash>.json     {"teams": [...], "by_name": {team_name: i}}
+  players.<CODE>.<hash>.json   {"players": [...], "by_club": {team_name: [i, ...]}}
+
+Players are joined to teams.json through their sportmonks club_id/team_id
+(SPORTMONKS_CLUBS); players whose club is not in teams.json are filed under
+EPL, like the site does. Shards whose content did not change keep their file
+name, and shards no longer referenced by the index are deleted.
+
+Example:
+python3 data_bundles.py --teams-json teams.json --players-json data/players.json --out data/bundles
+"""
+from pathlib import Path
+import argparse
+import hashlib
+import json
+import os
+import threading
+
+BUNDLES_DIR = "data/bundles"
+INDEX_NAME = "index.json"
+DEFAULT_LEAGUE = "EPL"
+
+# Sportmonks team ids used as club_id in data/players.json (FALLBACK_TEAMS in
+# app.js, plus 1 and 3, which only appear in the squad data)
+SPORTMONKS_CLUBS = {
+    1: "West Ham United", 3: "Sunderland",
+    6: "Tottenham Hotspur", 8: "Liverpool", 9: "Manchester City", 10: "Southampton",
+    11: "Fulham", 13: "Everton", 14: "Manchester United", 15: "Aston Villa", 18: "Chelsea",
+    19: "Arsenal", 20: "Newcastle United", 21: "West Ham United", 26: "Leicester City",
+    27: "Burnley", 29: "Wolverhampton Wanderers", 51: "Crystal Palace", 52: "AFC Bournemouth",
+    62: "Sheffield United", 63: "Nottingham Forest", 71: "Leeds United", 78: "Brighton & Hove Albion",
+    236: "Brentford",
+}
+
+def _club_key(name):
+    # "Arsenal FC" / "Arsenal", "Sunderland AFC" / "Sunderland"
+    words = (name or "").lower().replace("&", "and").split()
+    return " ".join(w for w in words if w not in ("fc", "afc")) or " ".join(words)
+
+class ClubIndex:
+    """teams.json clubs joined to the sportmonks ids (club_id/team_id) of data/players.json."""
+
+    def __init__(self, teams):
+        self.by_key = {}
+        for t in teams:
+            if t.get("team_name") and t.get("league_code"):
+                self.by_key.setdefault(_club_key(t["team_name"]), t)
+        self.club_ids = {}  # team_name -> sportmonks id
+        for cid, name in SPORTMONKS_CLUBS.items():
+            t = self.by_key.get(_club_key(name))
+            if t:
+                self.club_ids.setdefault(t["team_name"], cid)
+
+    def team(self, club_id):
+        # teams.json entry of a sportmonks id, or None
+        try:
+            return self.by_key.get(_club_key(SPORTMONKS_CLUBS.get(int(club_id))))
+        except (TypeError, ValueError):
+            return None
+
+    def club_id(self, team_name):
+        return self.club_ids.get(team_name)
+
+    def league(self, club_id):
+        # league code of a sportmonks id; clubs not in teams.json go to EPL, like the site does
+        team = self.team(club_id)
+        return team["league_code"].upper() if team else DEFAULT_LEAGUE
+
+def _dumps(obj):
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"), sort_keys=True)
+
+def _write_shard(out_dir, stem, obj):
+    text = _dumps(obj)
+    name = f"{stem}.{hashlib.sha256(text.encode()).hexdigest()[:10]}.json"
+    p = out_dir / name
+    if not p.exists():
+        tmp = p.with_name(p.name + ".tmp")
+        tmp.write_text(text, encoding="utf-8")
+        os.replace(tmp, p)
+    return name
+
+def build_bundles(teams_json="teams.json", players_json="data/players.json", out_dir=BUNDLES_DIR):
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    teams = json.loads(Path(teams_json).read_text(encoding="utf-8"))
+    players = json.loads(Path(players_json).read_text(encoding="utf-8")) if players_json and Path(players_json).exists() else []
+
+    clubs = ClubIndex(teams)
+    leagues = {}
+    for t in teams:
+        code = (t.get("league_code") or "").upper()
+        if not code or not t.get("team_name"):
+            continue
+        rec = dict(t)
+        if clubs.club_id(t["team_name"]) is not None:
+            rec["club_id"] = clubs.club_id(t["team_name"])
+        leagues.setdefault(code, {"teams": [], "players": []})["teams"].append(rec)
+
+    for p in players:
+        cid = p.get("club_id") or p.get("team_id")
+        team = clubs.team(cid)
+        rec = {k: (v.strip() if isinstance(v, str) else v) for k, v in p.items()}
+        rec["team_name"] = team["team_name"] if team else SPORTMONKS_CLUBS.get(cid)
+        code = clubs.league(cid)
+        leagues.setdefault(code, {"teams": [], "players": []})["players"].append(rec)
+
+    index = {"version": 1, "leagues": {}}
+    for code, data in sorted(leagues.items()):
+        data["teams"].sort(key=lambda t: t["team_name"])
+        entry = {"teams": None, "players": None, "clubs": [t["team_name"] for t in data["teams"]],
+                 "team_count": len(data["teams"]), "player_count": len(data["players"])}
+        if data["teams"]:
+            entry["teams"] = _write_shard(out_dir, f"teams.{code}", {
+                "teams": data["teams"], "by_name": {t["team_name"]: i for i, t in enumerate(data["teams"])}})
+        if data["players"]:
+            by_club = {}
+            for i, p in enumerate(data["players"]):
+                by_club.setdefault(p.get("team_name") or "", []).append(i)
+            entry["players"] = _write_shard(out_dir, f"players.{code}", {"players": data["players"], "by_club": by_club})
+        index["leagues"][code] = entry
+
+    tmp = out_dir / (INDEX_NAME + ".tmp")
+    tmp.write_text(_dumps(index), encoding="utf-8")
+    os.replace(tmp, out_dir / INDEX_NAME)
+    live = {f for e in index["leagues"].values() for f in (e["teams"], e["players"]) if f}
+    for p in [*out_dir.glob("teams.*.*.json"), *out_dir.glob("players.*.*.json")]:
+        if p.name not in live:
+            p.unlink()
+    print(f"Bundles: {len(index['leagues'])} leagues, {len(live)} shards -> {out_dir / INDEX_NAME}")
+    return index
+
+class Bundles:
+    """Reads index.json up front; shards are loaded on first use and kept."""
+
+    def __init__(self, path=BUNDLES_DIR):
+        self.path = Path(path)
+        self.index = json.loads((self.path / INDEX_NAME).read_text(encoding="utf-8"))
+        self._shards = {}
+        self._lock = threading.Lock()
+        self._league_of = {club: code for code, e in self.index["leagues"].items() for club in e["clubs"]}
+
+    def _shard(self, name):
+        if not name:
+            return None
+        with self._lock:
+            if name not in self._shards:
+                self._shards[name] = json.loads((self.path / name).read_text(encoding="utf-8"))
+            return self._shards[name]
+
+    def leagues(self):
+        return list(self.index["leagues"])
+
+    def clubs(self, code):
+        # club names of a league, from the index alone (no shard load)
+        return list((self.index["leagues"].get(code.upper()) or {}).get("clubs", []))
+
+    def league_of(self, club):
+        return self._league_of.get(club)
+
+    def teams(self, codes=None):
+        # teams.json-shaped list for the given league code(s), or all leagues
+        if isinstance(codes, str):
+            codes = [codes]
+        out = []
+        for code in (codes or self.leagues()):
+            shard = self._shard((self.index["leagues"].get(code.upper()) or {}).get("teams"))
+            out.extend(shard["teams"] if shard else [])
+        return out
+
+    def team(self, club):
+        code = self.league_of(club)
+        shard = self._shard(self.index["leagues"][code]["teams"]) if code else None
+        return shard["teams"][shard["by_name"][club]] if shard and club in shard["by_name"] else None
+
+    def players(self, code, club=None):
+        shard = self._shard((self.index["leagues"].get(code.upper()) or {}).get("players"))
+        if not shard:
+            return []
+        if club is None:
+            return list(shard["players"])
+        return [shard["players"][i] for i in shard["by_club"].get(club, [])]
+
+def load_bundles(path=BUNDLES_DIR):
+    return Bundles(path)
+
+def main():
+    parser = argparse.ArgumentParser(description="Compile teams.json and players.json into per-league bundles")
+    parser.add_argument("--teams-json", default="teams.json")
+    parser.add_argument("--players-json", default="data/players.json")
+    parser.add_argument("--out", default=BUNDLES_DIR, help="Output directory (index.json + hashed shards)")
+    args = parser.parse_args()
+    build_bundles(args.teams_json, args.players_json, args.out)
+
+if __name__ == "__main__":
+    main()
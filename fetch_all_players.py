@@ -3,12 +3,14 @@
 Fetch / enrich player images.
 
 Modes:
-- File mode (--input-json): read players from that JSON file (list of objects),
-  resolve images (by wikidata_id or name), download images to --out, write CSV to --csv
-  and enriched players JSON to --json.
+- File mode (--input-json): stream players from that file (JSON array of
+  objects, or JSONL), resolve images (by wikidata_id or name), download images
+  to --out, write CSV to --csv and enriched players to --json (.jsonl for JSONL)
+  as they finish.
 
-- Clubs/SPARQL mode (no --input-json): read teams.json, find EPL clubs and
-  fetch players active in 2025/26 via SPARQL, resolve images by QID and save.
+- Clubs/SPARQL mode (no --input-json): read teams.json, find EPL clubs (or the
+  clubs of every league given in --leagues) and fetch players active in 2025/26
+  via SPARQL, resolve images by QID and save.
 
 Example (file mode):
 python3 fetch_all_players.py \
@@ -21,27 +23,70 @@ python3 fetch_all_players.py \
 
 Example (clubs mode):
 python3 fetch_all_players.py --out player_images/EPL --per-club 2 --max-total 40
+
+Example (every league in teams.json, one sub-folder per league code):
+python3 fetch_all_players.py --out player_images --leagues all --per-club 0 --workers 8 --deadline 3600
+
+Pass --cache-path (e.g. .cache/player_images.sqlite) to keep Wikidata/Commons
+lookups between runs; a warm re-run then barely touches the network.
+Resolved names are kept in an alias index (--aliases, default
+data/name-aliases.json) that is consulted before any search request.
+--attribution-db data/attribution.sqlite keeps attributions in an indexed SQLite
+store that every run upserts into as players finish; --csv (and
+--attribution-json) are then exported from the store, optionally limited to
+--export-leagues, so partial runs no longer drop earlier rows. The store has
+one row per player; file-mode rows get the league of their club_id's
+teams.json club (--teams-json).
+--resolver http://127.0.0.1:8808 sends every Wikimedia lookup to a running
+resolver_service.py, so several jobs share one set of warm caches.
+--derivatives img/derived also builds multi-width WebP/AVIF copies of the saved
+images (see image_derivatives.py).
+Finished players are journaled to <out>/.journal.jsonl as the run goes; after a
+crash, re-run the same command with --resume to pick up where it stopped.
 """
 from pathlib import Path
 import argparse
 import json
+import os
 import time
-import random
+from urllib.parse import unquote
+import threading
+from itertools import islice
+
 import requests
+from concurrent.futures import ThreadPoolExecutor
 
 from player_images import (
     wikidata_id_for,
+    known_id_for,
+    learn_alias,
+    save_aliases,
+    use_alias_index,
+    clean_name,
     player_image,
     player_image_by_qid,
+    player_images_by_qids,
+    polite_get,
+    wikidata_revisions,
+    commons_timestamps,
+    records_revisions,
+    forget,
     save_player_image,
+    flush_manifests,
     save_attributions,
+    AttributionStore,
+    use_sqlite_cache,
 )
+from pipeline_metrics import metrics
+from image_derivatives import build_derivatives
+from data_bundles import SPORTMONKS_CLUBS, ClubIndex, load_bundles
+from jsonstream import RecordWriter, iter_records
+from resolver_service import ResolverClient
 
 SPARQL_ENDPOINT = "https://query.wikidata.org/sparql"
 HEADERS = {"Accept": "application/sparql-results+json", "User-Agent": "player-images-batch/1.0 (footballspinner.com)"}
-
-def _polite():
-    time.sleep(random.uniform(0.08, 0.18))
+CLUB_QIDS_JSON = "data/club-qids.json"
+ALIASES_JSON = "data/name-aliases.json"
 
 def load_json(path):
     p = Path(path)
@@ -52,21 +97,122 @@ def load_json(path):
 def write_json(obj, path):
     p = Path(path)
     p.parent.mkdir(parents=True, exist_ok=True)
-    p.write_text(json.dumps(obj, ensure_ascii=False, indent=2), encoding="utf-8")
+    tmp = p.with_name(p.name + ".tmp")
+    tmp.write_text(json.dumps(obj, ensure_ascii=False, indent=2), encoding="utf-8")
+    os.replace(tmp, p)
+
+# --- Checkpoint journal ---
+JOURNAL_NAME = ".journal.jsonl"
+
+class Journal:
+    # Append-only JSONL of finished records ({"key": ..., "record": ...}),
+    # flushed after every line so an interrupted run can be resumed.
+    def __init__(self, path, resume=False):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.done = {}
+        if resume and self.path.exists():
+            with self.path.open(encoding="utf-8") as fh:
+                for line in fh:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # torn last line from a crash
+                    self.done[entry["key"]] = entry["record"]
+        self._fh = self.path.open("a" if resume else "w", encoding="utf-8")
+        self._lock = threading.Lock()
+    def __len__(self):
+        return len(self.done)
+    def get(self, key):
+        rec = self.done.get(key)
+        return dict(rec) if rec is not None else None
+    def append(self, key, record):
+        line = json.dumps({"key": key, "record": record}, ensure_ascii=False)
+        with self._lock:
+            self.done[key] = record
+            self._fh.write(line + "\n")
+            self._fh.flush()
+    def close(self):
+        with self._lock:
+            self._fh.close()
+
+# --- Incremental refresh state ---
+STATE_NAME = ".state.json"
+
+def _unchanged_since_last_run(jobs, state, width, resolver):
+    # Keys of already-enriched players whose entities and image file are
+    # unchanged since they were recorded in the state file. Caches of the
+    # changed ones are dropped so they are re-resolved from fresh data.
+    cands = {}
+    for rec, _, _, key in jobs:
+        st = state.get(key)
+        if st and st.get("revs") and rec.get("image_url") and rec.get("license"):
+            cands[key] = st
+    if not cands:
+        return set()
+    revs = resolver.wikidata_revisions([q for st in cands.values() for q in st["revs"]])
+    stamps = resolver.commons_timestamps([st["record"].get("filename") for st in cands.values() if st.get("file_ts")])
+    unchanged, stale_qids, stale_files = set(), [], []
+    for key, st in cands.items():
+        fn = st["record"].get("filename")
+        same = all(revs.get(q) == r for q, r in st["revs"].items())
+        same = same and (not st.get("file_ts") or stamps.get(fn) == st["file_ts"])
+        if same:
+            unchanged.add(key)
+        else:
+            stale_qids += st["revs"]
+            stale_files += [fn] if fn else []
+    if stale_qids or stale_files:
+        resolver.forget(stale_qids, stale_files, width=width)
+    return unchanged
+
+def _club_of(rec):
+    club = rec.get("club") or rec.get("team_name") or rec.get("club_name")
+    if club:
+        return club
+    try:
+        return SPORTMONKS_CLUBS.get(int(rec.get("club_id") or rec.get("team_id")))
+    except (TypeError, ValueError):
+        return None
+
+def _journal_key(qid, name):
+    return f"qid:{qid}" if qid else "name:" + " ".join((name or "").lower().split())
 
 # SPARQL helpers
-def players_active_2025_26_for_club(club_qid, limit=200):
-    q = f"""
+SPARQL_CLUB_CHUNK = 20  # clubs per VALUES block; chunks are halved when a result set is too large
+
+def _sparql_bindings(query, timeout):
+    # -> result bindings, or None when WDQS timed out or cut the response
+    # short, which a smaller VALUES block can fix. Rate limits, other 5xx and
+    # connection errors outlasted polite_get's retries and are raised:
+    # splitting the query would only multiply the requests.
+    try:
+        with metrics.timer("stage_seconds", stage="sparql"):
+            r = polite_get(SPARQL_ENDPOINT, params={"query": query}, headers=HEADERS, timeout=timeout)
+            if r.status_code == 500 and "TimeoutException" in r.text:  # WDQS' query time limit
+                return None
+            r.raise_for_status()
+            return r.json().get("results", {}).get("bindings", [])
+    except requests.Timeout:
+        return None
+    except ValueError:  # truncated JSON
+        return None
+
+def _roster_query(club_qids, limit):
+    values = " ".join(f"wd:{q}" for q in club_qids)
+    return f"""
 PREFIX xsd: <http://www.w3.org/2001/XMLSchema#>
 PREFIX wd: <http://www.wikidata.org/entity/>
+PREFIX wdt: <http://www.wikidata.org/prop/direct/>
 PREFIX p: <http://www.wikidata.org/prop/>
 PREFIX ps: <http://www.wikidata.org/prop/statement/>
 PREFIX pq: <http://www.wikidata.org/prop/qualifier/>
 PREFIX wikibase: <http://wikiba.se/ontology#>
 
-SELECT ?player ?playerLabel WHERE {{
+SELECT ?club ?player ?playerLabel ?image WHERE {{
+  VALUES ?club {{ {values} }}
   ?player p:P54 ?stmt .
-  ?stmt ps:P54 wd:{club_qid} .
+  ?stmt ps:P54 ?club .
   ?stmt wikibase:rank ?rank .
   FILTER(?rank != wikibase:DeprecatedRank)
   ?player wdt:P31 wd:Q5 .
@@ -74,20 +220,141 @@ SELECT ?player ?playerLabel WHERE {{
   OPTIONAL {{ ?stmt pq:P582 ?end. }}
   FILTER( !BOUND(?end)   || ?end  >= "2025-07-01T00:00:00Z"^^xsd:dateTime )
   FILTER( !BOUND(?start) || ?start <= "2026-06-30T23:59:59Z"^^xsd:dateTime )
+  OPTIONAL {{ ?player wdt:P18 ?image. }}
   SERVICE wikibase:label {{ bd:serviceParam wikibase:language "en". }}
 }}
 LIMIT {limit}
 """
-    _polite()
-    r = requests.get(SPARQL_ENDPOINT, params={"query": q}, headers=HEADERS, timeout=90)
-    r.raise_for_status()
-    res = []
-    for b in r.json().get("results", {}).get("bindings", []):
-        uri = b["player"]["value"]
-        label = b.get("playerLabel", {}).get("value")
-        res.append({"qid": uri.rsplit("/", 1)[-1], "label": label})
+
+def _run_roster_query(club_qids, limit_per_club):
+    limit = limit_per_club * len(club_qids)
+    bindings = _sparql_bindings(_roster_query(club_qids, limit), timeout=90)
+    if bindings is None and len(club_qids) == 1:
+        raise RuntimeError(f"SPARQL roster query for {club_qids[0]} timed out")
+    if bindings is None or (len(bindings) >= limit and len(club_qids) > 1):
+        # timed out or truncated: split the VALUES block and try again
+        mid = len(club_qids) // 2
+        return _run_roster_query(club_qids[:mid], limit_per_club) + _run_roster_query(club_qids[mid:], limit_per_club)
+    return bindings
+
+def players_active_2025_26_for_clubs(club_qids, limit=200, chunk=SPARQL_CLUB_CHUNK):
+    # One query per chunk of clubs instead of one per club.
+    # Returns {club_qid: [{"qid", "label", "image"}, ...]} in club order.
+    club_qids = list(dict.fromkeys(q for q in club_qids if q))
+    res = {q: [] for q in club_qids}
+    seen = set()
+    for i in range(0, len(club_qids), chunk):
+        for b in _run_roster_query(club_qids[i:i + chunk], limit):
+            club = b["club"]["value"].rsplit("/", 1)[-1]
+            qid = b["player"]["value"].rsplit("/", 1)[-1]
+            if (club, qid) in seen or club not in res:
+                continue
+            seen.add((club, qid))
+            image = b.get("image", {}).get("value")
+            res[club].append({
+                "qid": qid,
+                "label": b.get("playerLabel", {}).get("value"),
+                "image": unquote(image.rsplit("/", 1)[-1]) if image else None,
+            })
     return res
 
+# Batched name -> QID fallback: exact en label/alias matches among footballers
+# (P106 = association football player), with the club each was seen at.
+SPARQL_NAME_CHUNK = 50
+
+def _label_query(names, club_qids):
+    values = " ".join(json.dumps(n, ensure_ascii=False) + "@en" for n in names)
+    clubs = " ".join(f"wd:{q}" for q in club_qids)
+    club_block = f"OPTIONAL {{ VALUES ?club {{ {clubs} }} ?player wdt:P54 ?club . }}" if clubs else ""
+    return f"""
+PREFIX wd: <http://www.wikidata.org/entity/>
+PREFIX wdt: <http://www.wikidata.org/prop/direct/>
+PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
+PREFIX skos: <http://www.w3.org/2004/02/skos/core#>
+
+SELECT ?name ?player ?club WHERE {{
+  VALUES ?name {{ {values} }}
+  ?player rdfs:label|skos:altLabel ?name .
+  ?player wdt:P106 wd:Q937857 .
+  {club_block}
+}}
+"""
+
+def _run_label_query(names, club_qids):
+    bindings = _sparql_bindings(_label_query(names, club_qids), timeout=60)
+    if bindings is not None:
+        return bindings
+    if len(names) == 1:
+        raise RuntimeError(f"SPARQL label query for {names[0]!r} timed out")
+    mid = len(names) // 2
+    return _run_label_query(names[:mid], club_qids) + _run_label_query(names[mid:], club_qids)
+
+def qids_by_label(pairs, chunk=SPARQL_NAME_CHUNK):
+    # pairs: [(name, club_qid or None)] -> {(name, club_qid): qid} for names
+    # with one matching footballer (or one at that club); the rest are left out.
+    pairs = list(dict.fromkeys(pairs))
+    labels = list(dict.fromkeys(clean_name(n) for n, _ in pairs if clean_name(n)))
+    club_qids = sorted({c for _, c in pairs if c})
+    found = {}  # label -> {qid: set of clubs}
+    for i in range(0, len(labels), chunk):
+        for b in _run_label_query(labels[i:i + chunk], club_qids):
+            qid = b["player"]["value"].rsplit("/", 1)[-1]
+            club = b.get("club", {}).get("value", "").rsplit("/", 1)[-1] or None
+            clubs = found.setdefault(b["name"]["value"], {}).setdefault(qid, set())
+            if club:
+                clubs.add(club)
+    out = {}
+    for name, club in pairs:
+        cands = found.get(clean_name(name), {})
+        at_club = [q for q, clubs in cands.items() if club and club in clubs]
+        pick = at_club if at_club else list(cands)
+        if len(pick) == 1:
+            out[(name, club)] = pick[0]
+            learn_alias(name, pick[0], club if at_club else None)
+    return out
+
+def players_active_2025_26_for_club(club_qid, limit=200):
+    return players_active_2025_26_for_clubs([club_qid], limit=limit).get(club_qid, [])
+
+class LocalLookups:
+    """The Wikimedia lookups a run makes, done from this process.
+    resolver_service.ResolverClient has the same methods and sends them to a
+    running resolver instead; pass either as resolver=."""
+
+    player_image = staticmethod(player_image)
+    player_image_by_qid = staticmethod(player_image_by_qid)
+    player_images_by_qids = staticmethod(player_images_by_qids)
+    wikidata_id_for = staticmethod(wikidata_id_for)
+    qids_by_label = staticmethod(qids_by_label)
+    players_active_2025_26_for_clubs = staticmethod(players_active_2025_26_for_clubs)
+    records_revisions = staticmethod(records_revisions)
+    wikidata_revisions = staticmethod(wikidata_revisions)
+    commons_timestamps = staticmethod(commons_timestamps)
+    forget = staticmethod(forget)
+
+LOCAL = LocalLookups()
+
+_club_qids_lock = threading.Lock()
+
+def club_qids_for(clubs, sidecar_path=CLUB_QIDS_JSON, resolver=LOCAL):
+    # Club name -> QID, remembered in a sidecar JSON so later runs skip the search.
+    p = Path(sidecar_path)
+    with _club_qids_lock:
+        known = load_json(p) if p.exists() else {}
+    found = {}
+    for club in clubs:
+        if not known.get(club):
+            qid = resolver.wikidata_id_for(club, alias=False)
+            if qid:
+                found[club] = qid
+    if found:
+        # several leagues may run at once: merge into the latest file contents
+        with _club_qids_lock:
+            known = load_json(p) if p.exists() else {}
+            known.update(found)
+            write_json(dict(sorted(known.items())), p)
+    return {club: known.get(club) for club in clubs}
+
 def epl_clubs_from_teams(teams):
     clubs = []
     for t in teams:
@@ -98,128 +365,534 @@ def epl_clubs_from_teams(teams):
             clubs.append(name)
     return sorted(set(clubs))
 
+def league_clubs_from_teams(teams, league_codes=None):
+    # {league_code: sorted club names}, optionally limited to league_codes
+    wanted = {c.upper() for c in league_codes} if league_codes else None
+    leagues = {}
+    for t in teams:
+        name = t.get("team_name") or t.get("name")
+        code = (t.get("league_code") or "").upper()
+        if name and code and (wanted is None or code in wanted):
+            leagues.setdefault(code, set()).add(name)
+    return {code: sorted(names) for code, names in sorted(leagues.items())}
+
+STOP_GRACE_SECONDS = 30  # how long stopped league workers get to wind down
+_metrics_out = {"path": None, "fmt": None, "every": 0}  # set from --metrics* in main()
+
+def _record_done():
+    # count a finished player; rewrite the metrics file every N records when streaming
+    n = metrics.inc("records_total")
+    if _metrics_out["path"] and _metrics_out["every"] and n % _metrics_out["every"] == 0:
+        metrics.dump(_metrics_out["path"], _metrics_out["fmt"])
+
+def _ordered_map(fn, items, workers=1, stop=None):
+    # Yields fn(item) in input order; with workers > 1 the calls overlap on a
+    # thread pool. Request pacing is shared across threads by polite_get.
+    # Items not started yet when stop (a threading.Event) is set raise.
+    def call(item):
+        if stop is not None and stop.is_set():
+            raise RuntimeError("run stopped (deadline exceeded)")
+        return fn(item)
+    if workers and workers > 1:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            yield from pool.map(call, items)
+        return
+    for item in items:
+        yield call(item)
+
+def _search_qid(name, club=None, resolver=LOCAL):
+    try:
+        with metrics.timer("stage_seconds", stage="search"):
+            return resolver.wikidata_id_for(name, club)
+    except Exception as e:
+        print("Error searching QID for", name, ":", e)
+        return None
+
+def resolve_names(pairs, workers=1, club_qids_path=CLUB_QIDS_JSON, resolver=LOCAL):
+    # pairs: [(name, club name or None)] -> {(name, club name): qid}
+    # Alias index first (no network), then one batched SPARQL label lookup
+    # scoped to the known clubs, and wbsearchentities only for what is left.
+    pairs = list(dict.fromkeys(p for p in pairs if p[0]))
+    found = {}
+    for name, club in pairs:
+        qid = known_id_for(name)
+        if qid:
+            found[(name, club)] = qid
+    left = [p for p in pairs if p not in found]
+    if not left:
+        return found
+    club_names = sorted({c for _, c in left if c})
+    club_qids = club_qids_for(club_names, club_qids_path, resolver) if club_names else {}
+    with_club = [(name, club, club_qids.get(club)) for name, club in left]
+    for name, club, cq in with_club:
+        qid = known_id_for(name, cq) if cq else None
+        if qid:
+            found[(name, club)] = qid
+    with_club = [p for p in with_club if (p[0], p[1]) not in found]
+    try:
+        by_label = resolver.qids_by_label([(name, cq) for name, _, cq in with_club])
+    except Exception as e:
+        print("Batched label lookup failed, falling back to search:", e)
+        by_label = {}
+    for name, club, cq in with_club:
+        if (name, cq) in by_label:
+            found[(name, club)] = by_label[(name, cq)]
+    rest = [p for p in with_club if (p[0], p[1]) not in found]
+    print(f"Name lookup: {len(pairs) - len(left)} from alias index, {len(left) - len(rest)} from batched lookup, {len(rest)} searched")
+    for (name, club, _), qid in zip(rest, _ordered_map(lambda p: _search_qid(p[0], p[2], resolver), rest, workers)):
+        found[(name, club)] = qid
+    return found
+
 # --- File-mode enrichment ---
-def enrich_players_from_file(input_json, out_dir, width, csv_path=None, out_players_json=None, max_total=None):
-    players = load_json(input_json)
+STREAM_WINDOW = 500  # players resolved per batch while streaming the input
+
+def _windows(items, size):
+    window = []
+    for item in items:
+        window.append(item)
+        if len(window) >= size:
+            yield window
+            window = []
+    if window:
+        yield window
+
+def enrich_players_from_file(input_json, out_dir, width, csv_path=None, out_players_json=None, max_total=None, workers=1,
+                             resume=False, journal_path=None, incremental=False, club_qids_path=CLUB_QIDS_JSON, attributions=None,
+                             teams_json="teams.json", resolver=LOCAL):
+    # Players are streamed from input_json (JSON array or JSONL) and handled
+    # STREAM_WINDOW at a time: names and QIDs of a window are resolved in
+    # batches, then each enriched player is written to out_players_json
+    # (JSON or JSONL by extension) as soon as it is done. Players past
+    # max_total are copied through unchanged.
     out_dir = Path(out_dir)
     out_dir.mkdir(parents=True, exist_ok=True)
     saved_records = []
     processed = 0
 
-    print(f"Loaded {len(players)} player entries from {input_json}")
+    print(f"Streaming players from {input_json}")
+    journal = Journal(journal_path or out_dir / JOURNAL_NAME, resume=resume)
+    if resume:
+        print(f"Resuming: {len(journal)} players already done")
+    state_path = out_dir / STATE_NAME
+    state = load_json(state_path) if state_path.exists() else {}
+    writer = RecordWriter(out_players_json) if out_players_json else None
+    unchanged_total = 0
+    changed = []
+    if attributions is not None:
+        # players.json has club ids, not leagues: file rows by their teams.json club
+        teams = load_json(teams_json) if isinstance(teams_json, (str, Path)) else teams_json
+        club_index = ClubIndex(teams or [])
+        leagues_seen = set()
 
-    for rec in players:
-        if max_total and processed >= max_total:
-            break
-        name = rec.get("name") or rec.get("full_name") or rec.get("player_name")
-        qid = rec.get("wikidata_id") or rec.get("qid")
+    def enrich(players):
+        # -> (rec, record, key, origin) per player, in input order; origin is
+        # "unchanged" (--incremental), "journal" (replayed) or "fresh"
+        jobs = []
+        for rec in players:
+            name = rec.get("name") or rec.get("full_name") or rec.get("player_name")
+            qid = rec.get("wikidata_id") or rec.get("qid")
+            if qid and name:
+                learn_alias(name, qid)
+            jobs.append((rec, name, qid, _journal_key(qid, name)))
+
+        unchanged = set()
+        if incremental:
+            with metrics.timer("stage_seconds", stage="revisions"):
+                unchanged = _unchanged_since_last_run(jobs, state, width, resolver)
+
+        replayed = {job[3] for job in jobs if journal.get(job[3]) is not None}
+        # resolve QIDs first so entities can be fetched in batches
+        todo = [job for job in jobs if job[3] not in replayed and job[3] not in unchanged]
+        found = resolve_names([(name, _club_of(rec)) for rec, name, qid, _ in todo if not qid and name], workers, club_qids_path, resolver)
+        jobs = [(rec, name, qid or found.get((name, _club_of(rec))), key) for rec, name, qid, key in jobs]
         try:
-            if qid:
-                record = player_image_by_qid(qid, width=width)
-            else:
-                qid_search = wikidata_id_for(name) if name else None
-                if qid_search:
-                    record = player_image_by_qid(qid_search, width=width)
-                else:
-                    record = player_image(name, width=width)
+            with metrics.timer("stage_seconds", stage="resolve"):
+                resolved = resolver.player_images_by_qids([q for _, _, q, key in jobs if q and key not in unchanged and journal.get(key) is None], width=width)
         except Exception as e:
-            print("Error resolving image for", name, ":", e)
-            record = {"name": name, "qid": qid, "image_url": "/img/silhouette-player.png", "source": "fallback"}
-
-        # download
-        saved = save_player_image(record, out_dir=str(out_dir))
-        record["_saved_path"] = str(saved) if saved else ""
-        # merge into original rec for output JSON
-        rec.update({
-            "image_filename": record.get("filename"),
-            "image_url": record.get("image_url"),
-            "file_page": record.get("file_page"),
-            "author": record.get("author"),
-            "license": record.get("license"),
-            "image_source": record.get("source"),
-            "_saved_path": record.get("_saved_path")
-        })
-        saved_records.append({
-            "name": record.get("name"),
-            "qid": record.get("qid"),
-            "filename": record.get("filename"),
-            "file_page": record.get("file_page"),
-            "author": record.get("author"),
-            "license": record.get("license"),
-            "source": record.get("source"),
-            "image_url": record.get("image_url"),
-            "_saved_path": record.get("_saved_path")
-        })
-        processed += 1
-        if processed % 10 == 0:
-            print(f"Processed {processed} players...")
-        _polite()
+            print("Batch resolve failed, falling back to per-player lookups:", e)
+            resolved = {}
+
+        def process(job):
+            rec, name, qid, key = job
+            if key in unchanged:
+                _record_done()
+                return dict(state[key]["record"])
+            done = journal.get(key)
+            if done is not None:
+                _record_done()
+                return done
+            try:
+                if qid:
+                    record = dict(resolved.get(qid) or resolver.player_image_by_qid(qid, width=width))
+                else:
+                    record = resolver.player_image(name, width=width)
+            except Exception as e:
+                print("Error resolving image for", name, ":", e)
+                record = {"name": name, "qid": qid, "image_url": "/img/silhouette-player.png", "source": "fallback"}
+
+            # download
+            with metrics.timer("stage_seconds", stage="download"):
+                saved = save_player_image(record, out_dir=str(out_dir))
+            record["_saved_path"] = str(saved) if saved else ""
+            journal.append(key, record)
+            _record_done()
+            return record
+
+        for (rec, _, _, key), record in zip(jobs, _ordered_map(process, jobs, workers)):
+            yield rec, record, key, "unchanged" if key in unchanged else "journal" if key in replayed else "fresh"
+
+    source = iter_records(input_json)
+    try:
+        for window in _windows(islice(source, max_total) if max_total else source, STREAM_WINDOW):
+            fresh = []
+            for rec, record, key, origin in enrich(window):
+                same = origin == "unchanged"
+                old_url = rec.get("image_url")
+                # merge into original rec for output JSON
+                rec.update({
+                    "image_filename": record.get("filename"),
+                    "image_url": record.get("image_url"),
+                    "file_page": record.get("file_page"),
+                    "author": record.get("author"),
+                    "license": record.get("license"),
+                    "image_source": record.get("source"),
+                    "_saved_path": record.get("_saved_path")
+                })
+                if writer:
+                    writer.write(rec)
+                row = {
+                    "name": record.get("name"),
+                    "qid": record.get("qid"),
+                    "filename": record.get("filename"),
+                    "file_page": record.get("file_page"),
+                    "author": record.get("author"),
+                    "license": record.get("license"),
+                    "source": record.get("source"),
+                    "image_url": record.get("image_url"),
+                    "_saved_path": record.get("_saved_path")
+                }
+                saved_records.append(row)
+                if attributions is not None:
+                    cid = rec.get("club_id") or rec.get("team_id")
+                    team = club_index.team(cid)
+                    league = (rec.get("league_code") or club_index.league(cid)).upper()
+                    leagues_seen.add(league)
+                    attributions.upsert(row, league_code=league, club=team["team_name"] if team else _club_of(rec))
+                # remember what each record was built from, for the next --incremental run
+                if same:
+                    unchanged_total += 1
+                elif origin == "fresh" and record.get("qid"):
+                    fresh.append((key, record))
+                if incremental and not same and old_url != rec.get("image_url"):
+                    changed.append({"name": rec.get("name"), "old": old_url, "new": rec.get("image_url")})
+                processed += 1
+                if processed % 10 == 0:
+                    print(f"Processed {processed} players...")
+            # one batched revisions pass per window (journal replays keep their old state)
+            if fresh:
+                try:
+                    for (key, record), revs in zip(fresh, resolver.records_revisions([r for _, r in fresh])):
+                        state[key] = {"record": record, **revs}
+                except Exception as e:
+                    print("Could not record revisions for this window:", e)
+        if writer:
+            for rec in source:  # past max_total: copied through as-is
+                writer.write(rec)
+            writer.close()
+            print("Wrote enriched players JSON to", out_players_json)
+    except BaseException:
+        if writer:
+            writer.abort()
+        raise
+    finally:
+        journal.close()
+
+    write_json(state, state_path)
+    save_aliases()
+    if incremental:
+        diff = {"unchanged": unchanged_total, "refreshed": processed - unchanged_total, "image_changed": changed}
+        write_json(diff, out_dir / "refresh-diff.json")
+        print(f"Refresh diff: {diff['unchanged']} unchanged, {diff['refreshed']} refreshed, {len(changed)} image changes "
+              f"(details in {out_dir / 'refresh-diff.json'})")
 
     # write outputs
-    if out_players_json:
-        write_json(players, out_players_json)
-        print("Wrote enriched players JSON to", out_players_json)
     if csv_path:
-        save_attributions(saved_records, csv_path)
+        if attributions is not None and leagues_seen:
+            attributions.export_csv(csv_path, leagues=sorted(leagues_seen))
+        else:
+            save_attributions(saved_records, csv_path)
         print("Wrote attribution CSV to", csv_path)
+    flush_manifests()
     print("Done. Processed:", processed)
     return saved_records
 
 # --- Clubs/SPARQL mode ---
-def fetch_via_teams_and_sparql(teams_json, out_dir, width, csv_path=None, max_total=None, per_club=None):
-    teams = load_json(teams_json)
-    clubs = epl_clubs_from_teams(teams)
+def fetch_via_teams_and_sparql(teams_json, out_dir, width, csv_path=None, max_total=None, per_club=None, workers=1, club_qids_path=CLUB_QIDS_JSON, league_code="EPL",
+                               resume=False, journal_path=None, attributions=None, stop=None, budget=None, resolver=LOCAL):
+    # stop: threading.Event that abandons the run; budget: a _Budget shared
+    # with other leagues that caps the players picked (on top of max_total);
+    # resolver: where lookups go (LOCAL, or a ResolverClient)
+    teams = load_json(teams_json) if isinstance(teams_json, (str, Path)) else teams_json
+    league_code = league_code.upper()
+    if league_code == "EPL":
+        clubs = epl_clubs_from_teams(teams)
+    else:
+        clubs = league_clubs_from_teams(teams, [league_code]).get(league_code, [])
     out_dir = Path(out_dir); out_dir.mkdir(parents=True, exist_ok=True)
     all_rows = []; total = 0
-    print(f"Found {len(clubs)} EPL clubs in teams.json")
+    print(f"Found {len(clubs)} {league_code} clubs in teams.json")
 
+    # one roster query for the whole league, then resolve every selected player in one batched pass
+    club_qids = club_qids_for(clubs, club_qids_path, resolver)
+    for club in clubs:
+        if not club_qids.get(club):
+            print("No QID for club", club)
+    rosters = resolver.players_active_2025_26_for_clubs([club_qids[c] for c in clubs if club_qids.get(c)], limit=200)
+    for club_qid, plist in rosters.items():
+        for p in plist:
+            if p["label"] and p["label"] != p["qid"]:
+                learn_alias(p["label"], p["qid"], club_qid)
+    save_aliases()
+    picks = []
     for club in clubs:
         if max_total and total >= max_total:
             break
-        qid = wikidata_id_for(club)
-        if not qid:
-            print("No QID for club", club); continue
-        candidates = players_active_2025_26_for_club(qid, limit=200)
         n = 0
-        for p in candidates:
+        for p in rosters.get(club_qids.get(club), []):
             if per_club is not None and n >= per_club:
                 break
             if max_total and total >= max_total:
                 break
-            player_qid = p["qid"]
-            rec = player_image_by_qid(player_qid, width=width)
-            rec["club"] = club; rec["league_code"] = "EPL"
-            saved = save_player_image(rec, out_dir=str(out_dir))
-            rec["_saved_path"] = str(saved) if saved else ""
-            all_rows.append(rec)
+            picks.append((club, p["qid"]))
             n += 1; total += 1
-            _polite()
+    if budget is not None:
+        picks = picks[:budget.take(len(picks))]
+        total = len(picks)
+    journal = Journal(journal_path or out_dir / JOURNAL_NAME, resume=resume)
+    if resume:
+        print(f"Resuming {league_code}: {len(journal)} players already done")
+    with metrics.timer("stage_seconds", stage="resolve"):
+        resolved = resolver.player_images_by_qids([q for c, q in picks if journal.get(f"{c}:{q}") is None], width=width)
+
+    def process(pick):
+        club, player_qid = pick
+        done = journal.get(f"{club}:{player_qid}")
+        if done is not None:
+            if attributions is not None:
+                attributions.upsert(done, league_code=league_code, club=club)
+            _record_done()
+            return done
+        rec = dict(resolved.get(player_qid) or resolver.player_image_by_qid(player_qid, width=width))
+        rec["club"] = club; rec["league_code"] = league_code
+        with metrics.timer("stage_seconds", stage="download"):
+            saved = save_player_image(rec, out_dir=str(out_dir))
+        rec["_saved_path"] = str(saved) if saved else ""
+        journal.append(f"{club}:{player_qid}", rec)
+        if attributions is not None:
+            attributions.upsert(rec, league_code=league_code, club=club)
+        _record_done()
+        return rec
+
+    try:
+        rows = list(_ordered_map(process, picks, workers, stop))
+    finally:
+        journal.close()
+    saved_per_club = {}
+    for rec in rows:
+        all_rows.append(rec)
+        saved_per_club[rec["club"]] = saved_per_club.get(rec["club"], 0) + 1
+    for club, n in saved_per_club.items():
         print(f"Club {club}: saved {n} players")
     if csv_path:
-        save_attributions(all_rows, csv_path)
-    print("Done. total saved:", total)
+        if attributions is not None:
+            attributions.export_csv(csv_path, leagues=[league_code])
+        else:
+            save_attributions(all_rows, csv_path)
+    flush_manifests()
+    print(f"Done ({league_code}). total saved:", total)
     return all_rows
 
+# --- All-leagues mode ---
+class _Budget:
+    # players left for a --leagues run, shared by the league workers
+    def __init__(self, total):
+        self.left = total
+        self._lock = threading.Lock()
+
+    def take(self, n):
+        with self._lock:
+            n = min(n, self.left)
+            self.left -= n
+            return n
+
+def fetch_leagues(teams_json, leagues, out_dir, width, csv_path=None, max_total=None, per_club=None, workers=1,
+                  club_qids_path=CLUB_QIDS_JSON, league_workers=4, deadline=None, resume=False, attributions=None, resolver=LOCAL):
+    # Runs each league as its own job writing to <out>/<code>/ (images +
+    # attribution.csv), so a slow or failing league never blocks the others.
+    # Leagues still running after `deadline` seconds are stopped, reported
+    # and skipped. max_total is one budget for all leagues together.
+    stop = threading.Event()
+    budget = _Budget(max_total) if max_total else None
+    teams = load_json(teams_json) if isinstance(teams_json, (str, Path)) else teams_json
+    available = league_clubs_from_teams(teams)
+    if not leagues or [l.lower() for l in leagues] == ["all"]:
+        codes = list(available)
+    else:
+        codes = [c.upper() for c in leagues]
+        for code in codes:
+            if code not in available:
+                print("No clubs for league", code)
+        codes = [c for c in codes if c in available]
+    out_dir = Path(out_dir)
+    print(f"Running {len(codes)} leagues: {', '.join(codes)}")
+
+    def run(code):
+        league_dir = out_dir / code
+        return fetch_via_teams_and_sparql(teams, league_dir, width, csv_path=league_dir / "attribution.csv",
+                                          per_club=per_club, workers=workers,
+                                          club_qids_path=club_qids_path, league_code=code, resume=resume,
+                                          attributions=attributions, stop=stop, budget=budget, resolver=resolver)
+
+    pending = list(codes)
+    results = {}; failed = {}
+    lock = threading.Lock()
+
+    def worker():
+        while not stop.is_set():
+            with lock:
+                if not pending:
+                    return
+                code = pending.pop(0)
+                if budget is not None and budget.left <= 0:
+                    results[code] = []  # budget spent by the other leagues
+                    continue
+            try:
+                rows = run(code)
+                with lock:
+                    results[code] = rows
+            except Exception as e:
+                with lock:
+                    failed[code] = str(e)
+                print(f"League {code} failed:", e)
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(max(1, min(league_workers, len(codes))))]
+    for t in threads:
+        t.start()
+    end = time.monotonic() + deadline if deadline else None
+    for t in threads:
+        t.join(None if end is None else max(0.0, end - time.monotonic()))
+    if any(t.is_alive() for t in threads):
+        # stop the running leagues and let them wind down before the exports
+        # and the caller's teardown (attributions.close(), ...)
+        stop.set()
+        grace = time.monotonic() + STOP_GRACE_SECONDS
+        for t in threads:
+            t.join(max(0.0, grace - time.monotonic()))
+        alive = sum(t.is_alive() for t in threads)
+        if alive:
+            print(f"{alive} league worker(s) still busy {STOP_GRACE_SECONDS}s after the deadline; their results are dropped")
+    with lock:
+        pending.clear()
+        for code in codes:
+            if code not in results and code not in failed:
+                failed[code] = "deadline exceeded"
+                print(f"League {code} did not finish within {deadline}s")
+        results = dict(results)
+
+    all_rows = [row for code in codes for row in results.get(code, [])]
+    if csv_path:
+        if attributions is not None:
+            attributions.export_csv(csv_path, leagues=codes)
+        else:
+            save_attributions(all_rows, csv_path)
+    print(f"Leagues done: {len(results)} ok, {len(failed)} failed. total saved: {len(all_rows)}")
+    return results, failed
+
 def main():
     parser = argparse.ArgumentParser(description="Fetch player images (file mode or clubs mode)")
-    parser.add_argument("--input-json", help="Path to players.json to enrich (file mode)")
-    parser.add_argument("--teams-json", default="teams.json", help="Path to teams.json (clubs mode)")
+    parser.add_argument("--input-json", help="Path to players.json / .jsonl to enrich (file mode)")
+    parser.add_argument("--teams-json", default="teams.json", help="Path to teams.json (clubs mode; file mode: leagues of --attribution-db rows)")
+    parser.add_argument("--bundles", help="Clubs mode: read teams from compiled data bundles (data_bundles.py) instead of teams.json; only the requested leagues' shards are loaded")
     parser.add_argument("--out", required=True, help="Output images directory")
     parser.add_argument("--width", type=int, default=800, help="Image width when requesting from Commons")
     parser.add_argument("--csv", help="Path to attribution CSV to write")
-    parser.add_argument("--json", dest="out_json", help="Path to write enriched players JSON (only in file mode)")
+    parser.add_argument("--json", dest="out_json", help="Path to write enriched players JSON, or JSONL for .jsonl (only in file mode)")
+    parser.add_argument("--leagues", help="Clubs mode: comma-separated league codes from teams.json, or 'all' (writes <out>/<code>/)")
+    parser.add_argument("--league-workers", type=int, default=4, help="Leagues processed at the same time (with --leagues)")
+    parser.add_argument("--deadline", type=float, default=None, help="Seconds before unfinished leagues are abandoned (with --leagues)")
+    parser.add_argument("--club-qids", default=CLUB_QIDS_JSON, help="Sidecar JSON caching club name -> Wikidata QID")
+    parser.add_argument("--aliases", default=ALIASES_JSON, help="Alias index (name -> QID) consulted before searching Wikidata; '' to disable")
     parser.add_argument("--per-club", type=int, default=5, help="Max players per club in clubs mode (use 0 or omit for all)")
-    parser.add_argument("--max-total", type=int, default=None, help="Max total players to process")
+    parser.add_argument("--max-total", type=int, default=None, help="Max total players to process (with --leagues: shared by all leagues)")
+    parser.add_argument("--workers", type=int, default=1, help="Concurrent lookups/downloads (request rate stays shared)")
+    parser.add_argument("--resume", action="store_true", help="Skip players already recorded in the run journal (<out>/.journal.jsonl) and replay them into the outputs")
+    parser.add_argument("--incremental", action="store_true", help="File mode: only re-resolve enriched players whose Wikidata entity or Commons file changed since the last run")
+    parser.add_argument("--journal", help="Journal path (default: <out>/.journal.jsonl; per league with --leagues)")
+    parser.add_argument("--metrics", help="Write run metrics (HTTP calls, cache hits, retries, bytes, stage latency) to this file at the end")
+    parser.add_argument("--metrics-format", choices=["json", "prometheus"], help="Metrics format (default: from extension, .prom/.txt = prometheus)")
+    parser.add_argument("--metrics-every", type=int, default=0, help="Also rewrite the metrics file every N finished players")
+    parser.add_argument("--derivatives", help="After the run, build resized WebP/AVIF renditions of the saved images (and a srcset manifest) into this directory")
+    parser.add_argument("--cache-path", help="SQLite file for a persistent Wikidata/Commons cache shared across runs")
+    parser.add_argument("--resolver", help="URL of a running resolver_service.py to resolve images through (e.g. http://127.0.0.1:8808)")
+    parser.add_argument("--attribution-db", help="SQLite attribution store upserted as players finish; --csv/--attribution-json are exported from it")
+    parser.add_argument("--attribution-json", help="With --attribution-db: also export the attributions as JSON to this path")
+    parser.add_argument("--export-leagues", help="With --attribution-db: comma-separated league codes to limit the exports to")
     args = parser.parse_args()
 
+    if args.cache_path:
+        use_sqlite_cache(args.cache_path)
+    if args.aliases:
+        use_alias_index(args.aliases)
+    resolver = LOCAL
+    if args.resolver:
+        # lookups go to a running resolver_service (warm caches shared between
+        # jobs); downloads stay local
+        resolver = ResolverClient(args.resolver)
+        resolver.health()
+    _metrics_out.update(path=args.metrics, fmt=args.metrics_format, every=args.metrics_every)
+    attributions = AttributionStore(args.attribution_db) if args.attribution_db else None
+
     per_club = args.per_club if args.per_club and args.per_club > 0 else None
+    teams = args.teams_json
+    if args.bundles and not args.input_json:
+        bundles = load_bundles(args.bundles)
+        codes = args.leagues.split(",") if args.leagues else ["EPL"]
+        teams = bundles.teams(None if [c.lower() for c in codes] == ["all"] else codes)
 
     if args.input_json:
         print("Running in file mode (enrich players.json)...")
-        records = enrich_players_from_file(args.input_json, args.out, args.width, args.csv, args.out_json, max_total=args.max_total)  # call function directly
+        records = enrich_players_from_file(args.input_json, args.out, args.width, args.csv, args.out_json, max_total=args.max_total, workers=args.workers,
+                                           resume=args.resume, journal_path=args.journal, incremental=args.incremental,
+                                           club_qids_path=args.club_qids, attributions=attributions, teams_json=args.teams_json,
+                                           resolver=resolver)  # call function directly
+    elif args.leagues:
+        print("Running in clubs/SPARQL mode (leagues from teams.json)...")
+        fetch_leagues(teams, args.leagues.split(","), args.out, args.width, args.csv, max_total=args.max_total,
+                      per_club=per_club, workers=args.workers, club_qids_path=args.club_qids,
+                      league_workers=args.league_workers, deadline=args.deadline, resume=args.resume,
+                      attributions=attributions, resolver=resolver)
     else:
         print("Running in clubs/SPARQL mode (Premier League clubs from teams.json)...")
-        records = fetch_via_teams_and_sparql(args.teams_json, args.out, args.width, args.csv, max_total=args.max_total, per_club=per_club)
+        records = fetch_via_teams_and_sparql(teams, args.out, args.width, args.csv, max_total=args.max_total, per_club=per_club, workers=args.workers, club_qids_path=args.club_qids,
+                                             resume=args.resume, journal_path=args.journal, attributions=attributions,
+                                             resolver=resolver)
+
+    if attributions is not None:
+        export_leagues = [c.strip() for c in args.export_leagues.split(",") if c.strip()] if args.export_leagues else None
+        if args.csv and export_leagues:
+            attributions.export_csv(args.csv, leagues=export_leagues)
+        if args.attribution_json:
+            attributions.export_json(args.attribution_json, leagues=export_leagues)
+            print("Wrote attribution JSON to", args.attribution_json)
+        print(f"Attribution store: {len(attributions)} rows in {args.attribution_db}")
+        attributions.close()
+
+    if args.derivatives:
+        build_derivatives([args.out], args.derivatives)
+
+    if args.metrics:
+        metrics.dump(args.metrics, args.metrics_format)
+        print("Wrote metrics to", args.metrics)
 
 if __name__ == "__main__":
     main()
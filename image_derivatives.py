@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+# File: image_derivatives.py
+# Resized WebP/AVIF renditions of club logos (logos1/vendor) and downloaded
+# player images, built across CPU cores, plus a manifest the site can turn
+# into srcset attributes. Also packs each league's logos into one sprite
+# atlas (--sprites).
+"""
+Build image derivatives.
+
+Every source image gets one file per width and format under --out, e.g.
+  img/derived/logos1/vendor/England - Premier League/Arsenal-128.webp
+Widths above the source width are skipped (no upscaling). The manifest
+(<out>/manifest.json) is keyed by source path below its --src root,
+prefixed with the root as given (so logos1/vendor/... matches teams.json
+logo_url) or, for an absolute root, with its last component; renditions
+always land inside --out. It stores the source sha256, and the srcset URLs
+are paths from --site-root (the directory the site is served from). Unchanged
+sources are skipped on the next run, sources that disappeared are pruned,
+and files named like renditions (<name>-<width>.<format>) are never treated
+as sources. Club logos saved under a .svg name hold Commons' PNG rendering
+and are resized like any other image; a real vector SVG can't be rasterized
+by Pillow and is reported as failed.
+
+With --sprites, every league in teams.json instead gets one atlas
+(<out>/<code>-<hash>.webp and .png) with each logo fitted into a
+size x size cell. <out>/sprites.json maps league code -> atlas file and
+team_name -> {x, y, w, h}. A league is only repacked when its logos (or
+the cell size) changed, and the hash in the file name keeps CDN caches
+correct.
+
+Examples:
+python3 image_derivatives.py --src logos1/vendor --src player_images --out img/derived --widths 64,128,256 --formats webp,avif
+python3 image_derivatives.py --src /data/player_images --out /srv/site/img/derived --site-root /srv/site
+python3 image_derivatives.py --sprites --teams-json teams.json --out img/sprites --size 96
+"""
+from pathlib import Path
+import argparse
+import hashlib
+import json
+import os
+import re
+from urllib.parse import quote
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    from PIL import Image, features
+except ImportError:  # only needed when derivatives are actually built
+    Image = features = None
+
+WIDTHS = (64, 128, 256, 512)
+FORMATS = ("webp", "avif")
+QUALITY = {"webp": 80, "avif": 55}
+SOURCE_EXTS = {".png", ".jpg", ".jpeg", ".webp", ".gif", ".svg"}
+DERIVED_DIR = "img/derived"
+SITE_ROOT = Path(__file__).resolve().parent
+MANIFEST_NAME = "manifest.json"
+SPRITES_DIR = "img/sprites"
+SPRITES_NAME = "sprites.json"
+SPRITE_SIZE = 128
+SPRITE_FORMATS = ("webp", "png")
+
+def _sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(1 << 16), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def _prefix(root):
+    # the root as given when it is a plain relative path, else its last component
+    root = Path(root)
+    if root.is_absolute() or ".." in root.parts:
+        return Path(root.resolve().name)
+    return root
+
+def _key(root, path):
+    # manifest key (and output subpath): path below its source root, with the
+    # root's prefix; never absolute, so out_dir / key stays inside out_dir
+    root = Path(root)
+    if root.is_file():
+        return (_prefix(root.parent) / root.name).as_posix()
+    return (_prefix(root) / Path(path).relative_to(root)).as_posix()
+
+def available_formats(formats=FORMATS):
+    if Image is None:
+        raise RuntimeError("Pillow is required to build image derivatives (pip install Pillow)")
+    Image.init()
+    ok = [f for f in formats if (features.check(f) if f in ("webp", "avif") else f.upper() in Image.SAVE)]
+    for f in formats:
+        if f not in ok:
+            print(f"Pillow has no {f} support here; skipping {f} renditions")
+    return ok
+
+def _render(src, dest_base, widths, formats, quality):
+    # Runs in a worker process. Returns the source size and the files written.
+    try:
+        im = Image.open(src)
+    except Exception:
+        if Path(src).suffix.lower() == ".svg":
+            raise ValueError("vector SVG, which Pillow can't rasterize; serve it as-is") from None
+        raise
+    with im:
+        im.load()
+        if im.mode not in ("RGB", "RGBA"):
+            im = im.convert("RGBA" if "transparency" in im.info or im.mode in ("LA", "PA") else "RGB")
+        w0, h0 = im.size
+        targets = sorted({w for w in widths if w <= w0} or {w0})
+        files = {}
+        for w in targets:
+            h = max(1, round(h0 * w / w0))
+            frame = im if w == w0 else im.resize((w, h), Image.LANCZOS)
+            for fmt in formats:
+                out = Path(f"{dest_base}-{w}.{fmt}")
+                out.parent.mkdir(parents=True, exist_ok=True)
+                tmp = out.with_name(out.name + ".part")
+                frame.save(tmp, format=fmt.upper(), quality=quality.get(fmt, 80))
+                os.replace(tmp, out)
+                files.setdefault(fmt, {})[w] = out.as_posix()
+    return {"width": w0, "height": h0, "files": files}
+
+def _url(path, site_root, out_dir):
+    # URL path of a rendition: from the site root when it is served from
+    # there, else relative to out_dir (for a CDN mounted on it). Quoted, since
+    # league folders contain spaces, which srcset would split on.
+    p = Path(path).resolve()
+    try:
+        return "/" + quote(p.relative_to(site_root).as_posix())
+    except ValueError:
+        return quote(p.relative_to(out_dir).as_posix())
+
+def _srcset(files, site_root, out_dir):
+    return {fmt: ", ".join(f"{_url(path, site_root, out_dir)} {w}w" for w, path in sorted(by_w.items(), key=lambda kv: int(kv[0])))
+            for fmt, by_w in files.items()}
+
+def _rendition_re(widths=WIDTHS, formats=FORMATS):
+    # file names _render writes: <name>-<width>.<format>
+    return re.compile(rf"-(?:{'|'.join(str(w) for w in widths)})\.(?:{'|'.join(map(re.escape, formats))})$", re.I)
+
+def iter_sources(roots, exclude=None, renditions=None):
+    # (root, path) for every source image; files under exclude (the output
+    # directory) and names matching renditions are skipped
+    exclude = Path(exclude).resolve() if exclude else None
+    renditions = renditions or _rendition_re()
+    for root in roots:
+        root = Path(root)
+        if root.is_file():
+            yield root, root
+            continue
+        for p in sorted(root.rglob("*")):
+            if not p.is_file() or p.suffix.lower() not in SOURCE_EXTS or p.name.startswith(".") or renditions.search(p.name):
+                continue
+            if exclude and p.resolve().is_relative_to(exclude):
+                continue
+            yield root, p
+
+def build_derivatives(roots, out_dir=DERIVED_DIR, widths=WIDTHS, formats=FORMATS, workers=None, quality=None, site_root=SITE_ROOT):
+    out_dir = Path(out_dir)
+    site_root = Path(site_root).resolve()
+    manifest_path = out_dir / MANIFEST_NAME
+    manifest = json.loads(manifest_path.read_text(encoding="utf-8")) if manifest_path.exists() else {}
+    formats = available_formats(formats)
+    widths = sorted(set(widths))
+    quality = {**QUALITY, **(quality or {})}
+    params = {"widths": widths, "formats": formats, "quality": {f: quality[f] for f in formats}}
+
+    sources = {_key(root, p): p for root, p in iter_sources(roots, exclude=out_dir, renditions=_rendition_re(widths, formats))}
+    todo = []
+    skipped = 0
+    for key, path in sources.items():
+        sha = _sha256(path)
+        entry = manifest.get(key)
+        if (entry and entry.get("sha256") == sha and entry.get("params") == params
+                and all(Path(f).exists() for by_w in entry["files"].values() for f in by_w.values())):
+            entry["srcset"] = _srcset(entry["files"], site_root, out_dir.resolve())
+            skipped += 1
+            continue
+        todo.append((key, path, sha))
+
+    built = failed = 0
+    if todo:
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+            futures = [(key, sha, pool.submit(_render, str(path), str(out_dir / Path(key).with_suffix("")), widths, formats, quality))
+                       for key, path, sha in todo]
+            for key, sha, fut in futures:
+                try:
+                    info = fut.result()
+                except Exception as e:
+                    print("Could not build derivatives for", key, ":", e)
+                    failed += 1
+                    continue
+                manifest[key] = {"sha256": sha, "params": params, **info, "srcset": _srcset(info["files"], site_root, out_dir.resolve())}
+                built += 1
+
+    # sources that are gone (within the roots just scanned) lose their renditions
+    scanned = [_key(r, r) if Path(r).is_file() else _prefix(r).as_posix() for r in roots]
+    for key in [k for k in manifest if k not in sources and any(k == r or k.startswith(r.rstrip("/") + "/") for r in scanned)]:
+        for by_w in manifest.pop(key)["files"].values():
+            for f in by_w.values():
+                Path(f).unlink(missing_ok=True)
+
+    out_dir.mkdir(parents=True, exist_ok=True)
+    tmp = manifest_path.with_name(manifest_path.name + ".tmp")
+    tmp.write_text(json.dumps(dict(sorted(manifest.items())), ensure_ascii=False, indent=1), encoding="utf-8")
+    os.replace(tmp, manifest_path)
+    print(f"Derivatives: {built} built, {skipped} unchanged, {failed} failed -> {manifest_path}")
+    return {"built": built, "skipped": skipped, "failed": failed, "manifest": str(manifest_path)}
+
+# --- League sprite atlases ---
+def _pack_league(code, logos, out_dir, size, formats, digest):
+    # Runs in a worker process. logos: [(team_name, path)] -> atlas entry
+    cols = max(1, int(len(logos) ** 0.5 + 0.999))
+    rows = (len(logos) + cols - 1) // cols
+    sheet = Image.new("RGBA", (cols * size, rows * size), (0, 0, 0, 0))
+    teams = {}
+    for i, (team, path) in enumerate(logos):
+        with Image.open(path) as im:
+            im = im.convert("RGBA")
+            im.thumbnail((size, size), Image.LANCZOS)
+            x = (i % cols) * size + (size - im.width) // 2
+            y = (i // cols) * size + (size - im.height) // 2
+            sheet.paste(im, (x, y), im)
+            teams[team] = {"x": x, "y": y, "w": im.width, "h": im.height}
+    files = {}
+    for fmt in formats:
+        out = Path(out_dir) / f"{code}-{digest[:10]}.{fmt}"
+        tmp = out.with_name(out.name + ".part")
+        sheet.save(tmp, format=fmt.upper(), **({"quality": QUALITY.get(fmt, 80)} if fmt != "png" else {"optimize": True}))
+        os.replace(tmp, out)
+        files[fmt] = out.as_posix()
+    return {"digest": digest, "size": size, "width": sheet.width, "height": sheet.height, "files": files, "teams": teams}
+
+def build_league_sprites(teams_json="teams.json", out_dir=SPRITES_DIR, size=SPRITE_SIZE, formats=SPRITE_FORMATS, workers=None):
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    index_path = out_dir / SPRITES_NAME
+    index = json.loads(index_path.read_text(encoding="utf-8")) if index_path.exists() else {}
+    formats = available_formats(formats)
+    teams = json.loads(Path(teams_json).read_text(encoding="utf-8"))
+
+    leagues = {}
+    for t in teams:
+        code, name, logo = (t.get("league_code") or "").upper(), t.get("team_name"), t.get("logo_url")
+        if not (code and name and logo):
+            continue
+        if not Path(logo).is_file():
+            print("Missing logo for", name, ":", logo)
+            continue
+        leagues.setdefault(code, []).append((name, logo))
+
+    todo = []
+    for code, logos in sorted(leagues.items()):
+        logos.sort()
+        h = hashlib.sha256(json.dumps([size, formats]).encode())
+        for name, logo in logos:
+            h.update(f"{name}\0{_sha256(logo)}\0".encode())
+        digest = h.hexdigest()
+        entry = index.get(code)
+        if entry and entry.get("digest") == digest and all(Path(f).exists() for f in entry["files"].values()):
+            continue
+        todo.append((code, logos, digest))
+
+    if todo:
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+            futures = [(code, pool.submit(_pack_league, code, logos, str(out_dir), size, formats, digest)) for code, logos, digest in todo]
+            for code, fut in futures:
+                try:
+                    entry = fut.result()
+                except Exception as e:
+                    print("Could not build sprite for", code, ":", e)
+                    continue
+                old = index.get(code) or {}
+                for f in old.get("files", {}).values():
+                    if f not in entry["files"].values():
+                        Path(f).unlink(missing_ok=True)
+                index[code] = entry
+    for code in [c for c in index if c not in leagues]:
+        for f in index.pop(code)["files"].values():
+            Path(f).unlink(missing_ok=True)
+
+    tmp = index_path.with_name(index_path.name + ".tmp")
+    tmp.write_text(json.dumps(dict(sorted(index.items())), ensure_ascii=False, indent=1), encoding="utf-8")
+    os.replace(tmp, index_path)
+    print(f"Sprites: {len(todo)} leagues rebuilt, {len(leagues) - len(todo)} unchanged -> {index_path}")
+    return index
+
+def main():
+    parser = argparse.ArgumentParser(description="Build multi-width WebP/AVIF renditions and a srcset manifest, or per-league logo sprites")
+    parser.add_argument("--src", action="append", help="Source file or directory (repeatable; default: logos1/vendor)")
+    parser.add_argument("--out", default=DERIVED_DIR, help="Output directory (manifest.json is written here)")
+    parser.add_argument("--widths", default=",".join(map(str, WIDTHS)), help="Comma-separated target widths")
+    parser.add_argument("--formats", default=",".join(FORMATS), help="Comma-separated output formats (webp, avif)")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--site-root", default=str(SITE_ROOT), help="Directory the site is served from; srcset URLs are paths from here")
+    parser.add_argument("--sprites", action="store_true", help="Build one logo atlas per league from --teams-json instead (default --out img/sprites)")
+    parser.add_argument("--teams-json", default="teams.json", help="teams.json with league_code, team_name and logo_url (with --sprites)")
+    parser.add_argument("--size", type=int, default=SPRITE_SIZE, help="Sprite cell size in px (with --sprites)")
+    args = parser.parse_args()
+    if args.sprites:
+        out = args.out if args.out != DERIVED_DIR else SPRITES_DIR
+        formats = args.formats if args.formats != ",".join(FORMATS) else ",".join(SPRITE_FORMATS)
+        build_league_sprites(args.teams_json, out, size=args.size,
+                             formats=[f.strip().lower() for f in formats.split(",") if f.strip()], workers=args.workers)
+        return
+    build_derivatives(args.src or ["logos1/vendor"], args.out,
+                      widths=[int(w) for w in args.widths.split(",") if w.strip()],
+                      formats=[f.strip().lower() for f in args.formats.split(",") if f.strip()],
+                      workers=args.workers, site_root=args.site_root)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+# File: jsonstream.py
+# Streaming readers/writers for player lists: JSON arrays are parsed one
+# element at a time and JSONL one line at a time, and output is written as
+# records complete, then moved into place with an atomic rename.
+
+import json
+import os
+import textwrap
+from pathlib import Path
+
+CHUNK = 1 << 16
+JSONL_SUFFIXES = (".jsonl", ".ndjson")
+
+def _fmt_for(path, fmt=None):
+    if fmt:
+        return fmt
+    return "jsonl" if Path(path).suffix.lower() in JSONL_SUFFIXES else "json"
+
+def iter_records(path, chunk=CHUNK, fmt=None):
+    # Yields the elements of a top-level JSON array, or each value of a
+    # JSONL file (.jsonl/.ndjson or fmt="jsonl"), without loading the whole
+    # file. A JSON file whose top level is not an array is a ValueError.
+    fmt = _fmt_for(path, fmt)
+    dec = json.JSONDecoder()
+    with open(path, "r", encoding="utf-8") as fh:
+        buf, pos, eof = "", 0, False
+
+        def fill():
+            nonlocal buf, pos, eof
+            data = fh.read(chunk)
+            eof = not data
+            buf = buf[pos:] + data
+            pos = 0
+            return not eof
+
+        def skip(seps):
+            # advance past whitespace (and the given separators); False at EOF
+            nonlocal pos
+            while True:
+                while pos < len(buf) and (buf[pos].isspace() or buf[pos] in seps):
+                    pos += 1
+                if pos < len(buf) or not fill():
+                    return pos < len(buf)
+
+        if not skip(""):
+            return
+        array = fmt == "json"
+        if array:
+            if buf[pos] != "[":
+                raise ValueError(f"{path}: expected a JSON array at the top level")
+            pos += 1
+        while skip("," if array else ""):
+            if array and buf[pos] == "]":
+                return
+            try:
+                obj, end = dec.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                if fill():
+                    continue  # value crosses the chunk boundary
+                raise
+            if isinstance(obj, (int, float)) and not (end < len(buf) and (buf[end].isspace() or buf[end] in ",]")):
+                # a number cut at the chunk edge ("1." of "1.5e3") decodes as
+                # a shorter one; read on until a delimiter follows it
+                if fill():
+                    continue
+                if end < len(buf):
+                    raise json.JSONDecodeError("Expecting ',' delimiter", buf, end)
+            pos = end
+            yield obj
+        if array:
+            raise ValueError(f"{path}: unterminated JSON array")
+
+class RecordWriter:
+    """Writes records to <path>.part as they arrive and renames it to path
+    on close(). JSON output matches json.dump(records, indent=2)."""
+
+    def __init__(self, path, fmt=None):
+        self.path = Path(path)
+        self.fmt = _fmt_for(path, fmt)
+        self.count = 0
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.tmp = self.path.with_name(self.path.name + ".part")
+        self._fh = self.tmp.open("w", encoding="utf-8")
+
+    def write(self, record):
+        if self.fmt == "jsonl":
+            self._fh.write(json.dumps(record, ensure_ascii=False) + "\n")
+        else:
+            self._fh.write(("[\n" if not self.count else ",\n") + textwrap.indent(json.dumps(record, ensure_ascii=False, indent=2), "  "))
+        self._fh.flush()  # partial output stays readable during long runs
+        self.count += 1
+
+    def close(self):
+        if self._fh.closed:
+            return self.path
+        if self.fmt == "json":
+            self._fh.write("\n]\n" if self.count else "[]\n")
+        self._fh.close()
+        os.replace(self.tmp, self.path)
+        return self.path
+
+    def abort(self):
+        # keep <path>.part for inspection; the previous file stays untouched
+        self._fh.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+def write_records(records, path, fmt=None):
+    with RecordWriter(path, fmt) as w:
+        for rec in records:
+            w.write(rec)
+    return w.count
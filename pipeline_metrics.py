@@ -0,0 +1,111 @@
+# File: pipeline_metrics.py
+# Process-wide counters and latency histograms for the image pipeline
+# (player_images.py / fetch_all_players.py), dumped as JSON or Prometheus text.
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+# Histogram buckets (seconds), Prometheus style: each bucket counts observations <= bound
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+def _key(name, labels):
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+class Metrics:
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._dump_lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._counters = {}
+            self._hists = {}
+            self._started = time.time()
+
+    def inc(self, name, value=1, **labels):
+        k = _key(name, labels)
+        with self._lock:
+            self._counters[k] = self._counters.get(k, 0) + value
+            return self._counters[k]
+
+    def observe(self, name, seconds, **labels):
+        k = _key(name, labels)
+        with self._lock:
+            h = self._hists.get(k)
+            if h is None:
+                h = self._hists[k] = {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    h["buckets"][i] += 1
+            h["sum"] += seconds
+            h["count"] += 1
+
+    @contextmanager
+    def timer(self, name, **labels):
+        t = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - t, **labels)
+
+    def counter(self, name, **labels):
+        with self._lock:
+            return self._counters.get(_key(name, labels), 0)
+
+    def snapshot(self):
+        with self._lock:
+            counters = [{"name": n, "labels": dict(l), "value": v} for (n, l), v in sorted(self._counters.items())]
+            hists = [{"name": n, "labels": dict(l), "count": h["count"], "sum": round(h["sum"], 6),
+                      "buckets": dict(zip([str(b) for b in self.buckets], h["buckets"]))}
+                     for (n, l), h in sorted(self._hists.items())]
+            return {"started": self._started, "elapsed_s": round(time.time() - self._started, 3),
+                    "counters": counters, "histograms": hists}
+
+    def to_json(self):
+        return json.dumps(self.snapshot(), indent=2)
+
+    def to_prometheus(self, prefix="player_images_"):
+        snap = self.snapshot()
+        lines = []
+        def fmt(labels, extra=None):
+            items = list(labels.items()) + list((extra or {}).items())
+            if not items:
+                return ""
+            return "{" + ",".join(f'{k}="{str(v)}"' for k, v in items) + "}"
+        seen = set()
+        for c in snap["counters"]:
+            name = prefix + c["name"]
+            if name not in seen:
+                lines.append(f"# TYPE {name} counter"); seen.add(name)
+            lines.append(f"{name}{fmt(c['labels'])} {c['value']}")
+        for h in snap["histograms"]:
+            name = prefix + h["name"]
+            if name not in seen:
+                lines.append(f"# TYPE {name} histogram"); seen.add(name)
+            for bound, n in h["buckets"].items():
+                lines.append(f"{name}_bucket{fmt(h['labels'], {'le': bound})} {n}")
+            lines.append(f"{name}_bucket{fmt(h['labels'], {'le': '+Inf'})} {h['count']}")
+            lines.append(f"{name}_sum{fmt(h['labels'])} {h['sum']}")
+            lines.append(f"{name}_count{fmt(h['labels'])} {h['count']}")
+        return "\n".join(lines) + "\n"
+
+    def dump(self, path, fmt=None):
+        # fmt: "json" or "prometheus"; guessed from the extension (.prom/.txt) when omitted
+        p = Path(path)
+        if fmt is None:
+            fmt = "prometheus" if p.suffix in (".prom", ".txt") else "json"
+        text = self.to_prometheus() if fmt == "prometheus" else self.to_json()
+        p.parent.mkdir(parents=True, exist_ok=True)
+        with self._dump_lock:
+            tmp = p.with_name(p.name + ".tmp")
+            tmp.write_text(text, encoding="utf-8")
+            os.replace(tmp, p)  # readers (e.g. a textfile collector) never see a half-written file
+        return p
+
+metrics = Metrics()
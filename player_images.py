@@ -3,73 +3,558 @@
 # Exports functions used by fetch_all_players.py, including player_image_by_qid.
 
 from pathlib import Path
-import requests, time, random, csv
-from datetime import datetime, timedelta
-from urllib.parse import quote as urlquote
+import requests, time, random, csv, json, sqlite3, threading, os, shutil, hashlib, unicodedata, atexit
+from collections import OrderedDict
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from urllib.parse import quote as urlquote, urlparse
+
+from pipeline_metrics import metrics
 
 # Config
 USER_AGENT = "player-images-bot/1.0 (https://footballspinner.com/) mzaharievtest-cmd"
 WIKIDATA_API = "https://www.wikidata.org/w/api.php"
 COMMONS_API = "https://commons.wikimedia.org/w/api.php"
+COMMONS_FILEPATH = "https://commons.wikimedia.org/wiki/Special:FilePath/"
 CACHE_TTL_DAYS = 7
+WIKIDATA_BATCH = 50  # wbgetentities max ids per request for anonymous clients
+COMMONS_BATCH = 50   # query&titles= max titles per request for anonymous clients
 FALLBACK_LOCAL = "/img/silhouette-player.png"
 
 # HTTP session
 _session = requests.Session()
 _session.headers.update({"User-Agent": USER_AGENT})
 
-# Small in-memory TTL cache
-_cache = {}
-def _cached(key):
-    entry = _cache.get(key)
-    if not entry:
+# Cache backends. Keys are namespaced ("qid:", "entity:", "commons:",
+# "player_image_by_qid:"); each namespace may override the default TTL.
+# Negative results (no QID, no entity, no file on Commons) are cached too,
+# for NEGATIVE_CACHE_TTL_DAYS, so unresolvable names aren't searched again
+# on every call.
+CACHE_TTLS = {"qid": 30, "entity": CACHE_TTL_DAYS, "commons": 30, "player_image_by_qid": CACHE_TTL_DAYS}
+NEGATIVE_CACHE_TTL_DAYS = 1
+CACHE_MAX_ENTRIES = 100000
+MEMORY_CACHE_MAX_ENTRIES = 20000
+CACHE_SWEEP_SECONDS = 60
+_MISS = object()  # cache lookups: "not cached", as opposed to a cached None
+
+def _namespace(key):
+    return key.split(":", 1)[0]
+
+class MemoryCache:
+    # Process-local LRU with monotonic-clock expiry. Holds at most
+    # max_entries; expired entries are swept every CACHE_SWEEP_SECONDS.
+    def __init__(self, max_entries=MEMORY_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._data = OrderedDict()  # key -> (value, expires)
+        self._lock = threading.Lock()
+        self._next_sweep = time.monotonic() + CACHE_SWEEP_SECONDS
+        self.evicted = self.expired = 0
+    def __len__(self):
+        return len(self._data)
+    def lookup(self, key):
+        # (value, seconds left) or None
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            if entry[1] <= now:
+                del self._data[key]
+                self.expired += 1
+                return None
+            self._data.move_to_end(key)
+        return entry[0], entry[1] - now
+    def get(self, key, default=None):
+        entry = self.lookup(key)
+        return default if entry is None else entry[0]
+    def set(self, key, value, days):
+        self.put(key, value, days * 86400)
+    def put(self, key, value, seconds):
+        now = time.monotonic()
+        with self._lock:
+            self._data[key] = (value, now + seconds)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evicted += 1
+            if now >= self._next_sweep:
+                self._sweep(now)
+    def _sweep(self, now):
+        dead = [k for k, (_, expires) in self._data.items() if expires <= now]
+        for k in dead:
+            del self._data[k]
+        self.expired += len(dead)
+        self._next_sweep = now + CACHE_SWEEP_SECONDS
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+    def stats(self):
+        return {"memory_entries": len(self._data), "memory_evicted": self.evicted, "memory_expired": self.expired}
+    def close(self):
+        with self._lock:
+            self._data.clear()
+
+class SqliteCache:
+    # Persistent cache shared across runs; values are stored as JSON.
+    # Least-recently-used rows are evicted once max_entries is exceeded.
+    def __init__(self, path, max_entries=CACHE_MAX_ENTRIES):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._db = sqlite3.connect(str(path), isolation_level=None, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, ns TEXT, value TEXT, expires REAL, accessed REAL)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)")
+        self._db.execute("DELETE FROM cache WHERE expires < ?", (time.time(),))
+        self._evict()
+    def lookup(self, key):
+        # (value, seconds left) or None; expiry is wall-clock, it outlives the process
+        now = time.time()
+        with self._lock:
+            row = self._db.execute("SELECT value, expires FROM cache WHERE key = ?", (key,)).fetchone()
+            if not row:
+                return None
+            if row[1] < now:
+                self._db.execute("DELETE FROM cache WHERE key = ?", (key,))
+                return None
+            self._db.execute("UPDATE cache SET accessed = ? WHERE key = ?", (now, key))
+        return json.loads(row[0]), row[1] - now
+    def get(self, key, default=None):
+        entry = self.lookup(key)
+        return default if entry is None else entry[0]
+    def set(self, key, value, days):
+        now = time.time()
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO cache (key, ns, value, expires, accessed) VALUES (?, ?, ?, ?, ?)",
+                             (key, _namespace(key), json.dumps(value, ensure_ascii=False), now + days * 86400, now))
+            self._writes += 1
+            if self._writes % 500 == 0:
+                self._evict()
+    def delete(self, key):
+        with self._lock:
+            self._db.execute("DELETE FROM cache WHERE key = ?", (key,))
+    def _evict(self):
+        (count,) = self._db.execute("SELECT COUNT(*) FROM cache").fetchone()
+        if count > self.max_entries:
+            self._db.execute("DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY accessed LIMIT ?)", (count - self.max_entries,))
+    def stats(self):
+        with self._lock:
+            return {"sqlite_entries": self._db.execute("SELECT COUNT(*) FROM cache").fetchone()[0]}
+    def close(self):
+        with self._lock:
+            self._evict()
+            self._db.close()
+
+class TieredCache:
+    # Bounded MemoryCache in front of a persistent backend: reads are served
+    # from memory when possible, and backend hits are promoted with the TTL
+    # they have left.
+    def __init__(self, backend, memory=None):
+        self.backend = backend
+        self.memory = memory or MemoryCache()
+    def get(self, key, default=None):
+        entry = self.memory.lookup(key)
+        if entry is None:
+            entry = self.backend.lookup(key)
+            if entry is None:
+                return default
+            self.memory.put(key, *entry)
+        return entry[0]
+    def set(self, key, value, days):
+        self.memory.set(key, value, days)
+        self.backend.set(key, value, days)
+    def delete(self, key):
+        self.memory.delete(key)
+        self.backend.delete(key)
+    def stats(self):
+        return {**self.memory.stats(), **self.backend.stats()}
+    def close(self):
+        self.memory.close()
+        self.backend.close()
+
+_cache = MemoryCache()
+
+def set_cache_backend(backend):
+    global _cache
+    old = _cache
+    _cache = backend
+    old.close()
+    return backend
+
+def use_sqlite_cache(path, max_entries=CACHE_MAX_ENTRIES, memory_entries=MEMORY_CACHE_MAX_ENTRIES):
+    return set_cache_backend(TieredCache(SqliteCache(path, max_entries=max_entries), MemoryCache(memory_entries)))
+
+def cache_stats():
+    # hit / miss / negative_hit counts (all namespaces) plus backend sizes
+    out = {"hit": 0, "miss": 0, "negative_hit": 0}
+    for c in metrics.snapshot()["counters"]:
+        if c["name"] == "cache_requests_total":
+            out[c["labels"]["result"]] = out.get(c["labels"]["result"], 0) + c["value"]
+    stats = getattr(_cache, "stats", None)
+    return {**out, **(stats() if stats else {})}
+
+def forget(qids=(), filenames=(), width=800):
+    # Drop cached entities/resolutions/Commons metadata so the next lookup refetches them.
+    for qid in qids:
+        _cache.delete(f"entity:{qid}")
+        _cache.delete(f"player_image_by_qid:{qid}:{width}")
+    for fn in filenames:
+        _cache.delete(f"commons:{_commons_name(fn)}")
+
+def record_revisions(record):
+    # What a resolved record depended on: lastrevid of the player (and club,
+    # for club-logo fallbacks) plus the Commons upload timestamp of the file.
+    return records_revisions([record])[0]
+
+def records_revisions(records):
+    # record_revisions for many records: one batched entity pass for the
+    # players, one for the clubs of club-logo fallbacks, one Commons pass.
+    ents = wikidata_entities([r.get("qid") for r in records if r.get("qid")])
+    club_of = {r.get("qid"): _claim_value(ents.get(r.get("qid")), "P54") for r in records if r.get("source") == "club"}
+    clubs = wikidata_entities([c for c in club_of.values() if c]) if any(club_of.values()) else {}
+    metas = commons_meta_many([r.get("filename") for r in records if r.get("source") in ("player", "club")])
+    out = []
+    for record in records:
+        qid = record.get("qid")
+        ent = ents.get(qid) if qid else None
+        revs = {}
+        if ent:
+            revs[qid] = ent.get("lastrevid")
+            club_ent = clubs.get(club_of.get(qid)) if record.get("source") == "club" else None
+            if club_ent:
+                revs[club_of[qid]] = club_ent.get("lastrevid")
+        meta = metas.get(record.get("filename")) if record.get("source") in ("player", "club") else None
+        out.append({"revs": revs, "file_ts": (meta or {}).get("timestamp")})
+    return out
+
+def _is_negative(key, value):
+    # "nothing there" results: no QID/entity, a Commons file without
+    # imageinfo, or a silhouette fallback record
+    if value is None:
+        return True
+    ns = _namespace(key)
+    if ns == "commons":
+        return value.get("file_url") is None
+    if ns == "player_image_by_qid":
+        return value.get("source") == "fallback"
+    return False
+
+def _cached(key, default=None):
+    # Pass default=_MISS to tell a cached None (negative result) from a miss.
+    value = _cache.get(key, _MISS)
+    result = "miss" if value is _MISS else "negative_hit" if _is_negative(key, value) else "hit"
+    metrics.inc("cache_requests_total", namespace=_namespace(key), result=result)
+    return default if value is _MISS else value
+def _set_cache(key, value, days=None, negative=None):
+    if negative is None:
+        negative = _is_negative(key, value)
+    if days is None:
+        days = NEGATIVE_CACHE_TTL_DAYS if negative else CACHE_TTLS.get(_namespace(key), CACHE_TTL_DAYS)
+    _cache.set(key, value, days)
+
+# --- Rate limiting ---
+# One token bucket per host, shared by every thread and by fetch_all_players'
+# SPARQL calls. 429/503 and Wikidata maxlag responses pause the whole host
+# (Retry-After when given, jittered exponential backoff otherwise).
+RATE_LIMITS = {  # host: (requests per second, burst)
+    "www.wikidata.org": (10, 10),
+    "commons.wikimedia.org": (10, 10),
+    "upload.wikimedia.org": (10, 10),
+    "query.wikidata.org": (1, 2),
+}
+DEFAULT_RATE_LIMIT = (5, 5)
+MAXLAG = 5
+MAX_RETRIES = 5
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 60.0
+
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self._tokens = float(burst)
+        self._stamp = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+    def reserve(self):
+        # take a token; returns how long the caller must wait before using it
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._stamp) * self.rate)
+            self._stamp = now
+            self._tokens -= 1
+            return max(-self._tokens / self.rate, self._paused_until - now, 0.0)
+    def acquire(self):
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+    def pause(self, seconds):
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+class RateLimiter:
+    def __init__(self, limits=None, default=DEFAULT_RATE_LIMIT):
+        self.limits = dict(limits or {})
+        self.default = default
+        self._buckets = {}
+        self._lock = threading.Lock()
+    def bucket(self, url):
+        host = urlparse(url).netloc
+        with self._lock:
+            b = self._buckets.get(host)
+            if b is None:
+                b = self._buckets[host] = TokenBucket(*self.limits.get(host, self.default))
+            return b
+
+_limiter = RateLimiter(RATE_LIMITS)
+
+def _retry_after(resp):
+    value = resp.headers.get("Retry-After")
+    if not value:
         return None
-    value, expires = entry
-    if datetime.utcnow() < expires:
-        return value
-    del _cache[key]
-    return None
-def _set_cache(key, value, days=CACHE_TTL_DAYS):
-    _cache[key] = (value, datetime.utcnow() + timedelta(days=days))
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+def _backoff(attempt):
+    return min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt) * random.uniform(0.5, 1.5)
+
+def _endpoint(url, params):
+    # metrics label for a request
+    if url.startswith(COMMONS_FILEPATH) or "/Special:FilePath/" in url:
+        return "filepath"
+    action = (params or {}).get("action")
+    if action == "wbgetentities" and (params or {}).get("props") == "info":
+        return "wbgetentities_info"
+    if action:
+        return action
+    if "sparql" in url:
+        return "sparql"
+    return "download"
 
-def _polite():
-    time.sleep(random.uniform(0, 0.15))
+def polite_get(url, params=None, session=None, **kwargs):
+    # GET through the shared rate limiter; retries 429/503, maxlag and
+    # connection errors. The last response is returned as-is so callers keep
+    # using raise_for_status().
+    session = session or _session
+    if url in (WIKIDATA_API, COMMONS_API) and params is not None:
+        params = {**params, "maxlag": MAXLAG}
+    bucket = _limiter.bucket(url)
+    endpoint = _endpoint(url, params)
+    for attempt in range(MAX_RETRIES + 1):
+        metrics.observe("rate_limit_wait_seconds", bucket.acquire(), endpoint=endpoint)
+        metrics.inc("http_requests_total", endpoint=endpoint)
+        t = time.perf_counter()
+        try:
+            resp = session.get(url, params=params, **kwargs)
+        except (requests.ConnectionError, requests.Timeout):
+            metrics.inc("http_errors_total", endpoint=endpoint, reason="connection")
+            if attempt == MAX_RETRIES:
+                raise
+            metrics.inc("http_retries_total", endpoint=endpoint, reason="connection")
+            bucket.pause(_backoff(attempt))
+            continue
+        finally:
+            metrics.observe("http_request_seconds", time.perf_counter() - t, endpoint=endpoint)
+        if resp.status_code in (429, 503) or resp.headers.get("MediaWiki-API-Error") == "maxlag":
+            reason = "maxlag" if resp.status_code not in (429, 503) else str(resp.status_code)
+            if attempt == MAX_RETRIES:
+                metrics.inc("http_errors_total", endpoint=endpoint, reason=reason)
+                return resp
+            metrics.inc("http_retries_total", endpoint=endpoint, reason=reason)
+            delay = _retry_after(resp)
+            bucket.pause(delay if delay is not None else _backoff(attempt))
+            resp.close()
+            continue
+        return resp
+
+def clean_name(s):
+    # NFKC folds no-break spaces and compatibility forms ("Bernardo Silva\xa0")
+    return " ".join(unicodedata.normalize("NFKC", s or "").split())
 
 def _norm(s):
-    return " ".join((s or "").strip().lower().split())
+    return clean_name(s).lower()
+
+# --- Name -> QID alias index ---
+# Every player name that was ever resolved (search hits, roster labels, QIDs
+# already in the input) is remembered with the club it was seen at, so repeat
+# runs resolve names in memory. Keys are accent- and case-folded; entries are
+# (qid, club qid) pairs and the club is used to pick between namesakes.
+def alias_key(name):
+    s = unicodedata.normalize("NFKD", clean_name(name).casefold().replace("-", " "))
+    return " ".join("".join(c for c in s if not unicodedata.combining(c)).replace(".", " ").split())
+
+class AliasIndex:
+    def __init__(self, path=None):
+        self.path = Path(path) if path else None
+        self._lock = threading.Lock()
+        self._aliases = {}
+        self._dirty = False
+        if self.path and self.path.exists():
+            for key, entries in json.loads(self.path.read_text(encoding="utf-8")).items():
+                self._aliases[key] = [tuple(e) for e in entries]
+    def __len__(self):
+        return len(self._aliases)
+    def add(self, name, qid, club=None):
+        key = alias_key(name)
+        if not key or not qid:
+            return
+        with self._lock:
+            entries = self._aliases.setdefault(key, [])
+            if (qid, club) in entries:
+                return
+            if club is None and any(q == qid for q, _ in entries):
+                return
+            # a club sighting supersedes the club-less entry for the same qid
+            entries[:] = [e for e in entries if not (e[0] == qid and e[1] is None)] + [(qid, club)]
+            self._dirty = True
+    def lookup(self, name, club=None):
+        # QID when the name is unambiguous (among entries at `club`, if any are), else None
+        with self._lock:
+            entries = list(self._aliases.get(alias_key(name), ()))
+        if club:
+            entries = [e for e in entries if e[1] == club] or entries
+        qids = {q for q, _ in entries}
+        return qids.pop() if len(qids) == 1 else None
+    def save(self):
+        if not self.path:
+            return None
+        with self._lock:
+            if self._dirty:
+                data = {k: [list(e) for e in v] for k, v in sorted(self._aliases.items())}
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                tmp = self.path.with_name(self.path.name + ".tmp")
+                tmp.write_text(json.dumps(data, ensure_ascii=False, indent=1), encoding="utf-8")
+                os.replace(tmp, self.path)
+                self._dirty = False
+        return self.path
+
+_aliases = AliasIndex()
+
+def use_alias_index(path):
+    global _aliases
+    _aliases = AliasIndex(path)
+    return _aliases
+
+def learn_alias(name, qid, club=None):
+    _aliases.add(name, qid, club)
+
+def save_aliases():
+    return _aliases.save()
+
+def known_id_for(name, club=None, default=None):
+    # Offline lookup only: alias index, then the search cache. No network.
+    # default is returned when neither knows the name (a cached failed
+    # search returns None).
+    if not name: return default
+    qid = _aliases.lookup(name, club)
+    metrics.inc("alias_lookups_total", result="hit" if qid else "miss")
+    return qid or _cached(f"qid:{_norm(name)}", default)
 
 # --- Wikidata helpers ---
-def wikidata_id_for(name):
+def wikidata_id_for(name, club=None, alias=True):
+    # alias=False keeps club-name lookups out of the (player) alias index
     if not name: return None
     key = f"qid:{_norm(name)}"
-    cached = _cached(key)
-    if cached is not None:
-        return cached
-    _polite()
-    params = {"action":"wbsearchentities","format":"json","language":"en","search":name,"type":"item","limit":1}
-    r = _session.get(WIKIDATA_API, params=params, timeout=10)
+    qid = known_id_for(name, club, _MISS) if alias else _cached(key, _MISS)
+    if qid is not _MISS:
+        return qid
+    params = {"action":"wbsearchentities","format":"json","language":"en","search":clean_name(name),"type":"item","limit":5}
+    r = polite_get(WIKIDATA_API, params=params, timeout=10)
     r.raise_for_status()
     data = r.json()
-    qid = None
-    if data.get("search"):
-        qid = data["search"][0].get("id")
+    if data.get("error"):
+        # maxlag etc. that outlasted polite_get's retries: unknown, not "no QID"
+        print("Search failed for", name, ":", data["error"].get("code"))
+        return None
+    hits = data.get("search") or []
+    # prefer a football-related hit over whatever ranks first (namesakes, disambiguation pages)
+    hit = next((h for h in hits if "football" in (h.get("description") or "").lower()), hits[0] if hits else None)
+    qid = hit.get("id") if hit else None
     _set_cache(key, qid)
+    if alias:
+        learn_alias(name, qid, club)
     return qid
 
+def wikidata_entities(qids):
+    # Batched wbgetentities: up to WIKIDATA_BATCH ids per request, cache-first.
+    out = {}
+    missing = []
+    for qid in qids:
+        if not qid or qid in out or qid in missing:
+            continue
+        cached = _cached(f"entity:{qid}", _MISS)
+        if cached is not _MISS:
+            out[qid] = cached
+        else:
+            missing.append(qid)
+    for i in range(0, len(missing), WIKIDATA_BATCH):
+        chunk = missing[i:i + WIKIDATA_BATCH]
+        r = polite_get(WIKIDATA_API, params=_entities_params(chunk), timeout=20)
+        r.raise_for_status()
+        ents = _entities_from_response(chunk, r.json())
+        if ents is None:
+            # one malformed/unknown id fails the whole batch; retry them one by one
+            for qid in chunk:
+                out.update(wikidata_entities([qid]))
+            continue
+        out.update(ents)
+    return out
+
+def _entities_params(chunk):
+    return {"action":"wbgetentities","format":"json","ids":"|".join(chunk),"props":"info|claims|labels|descriptions"}
+
+def _entities_from_response(chunk, data):
+    # {qid: entity or None} for a wbgetentities batch (cached), or None when
+    # the batch failed as a whole and has to be retried id by id. Only ids
+    # Wikidata reports as missing are cached as None; after any other error
+    # (maxlag that outlasted the retries, ...) the ids are left out, uncached.
+    err = data.get("error")
+    if err:
+        if err.get("code") != "no-such-entity":
+            return {}
+        if len(chunk) > 1:
+            return None
+    out = {}
+    for ent_id, ent in data.get("entities", {}).items():
+        src = (ent.get("redirects") or {}).get("from") or ent_id
+        if src in chunk:
+            out[src] = None if "missing" in ent else ent
+    for qid in chunk:
+        _set_cache(f"entity:{qid}", out.get(qid))
+        out.setdefault(qid, None)
+    return out
+
+def wikidata_revisions(qids):
+    # Current lastrevid per entity (props=info only, never cached).
+    ids = list(dict.fromkeys(q for q in qids if q))
+    out = {}
+    for i in range(0, len(ids), WIKIDATA_BATCH):
+        chunk = ids[i:i + WIKIDATA_BATCH]
+        params = {"action":"wbgetentities","format":"json","ids":"|".join(chunk),"props":"info"}
+        r = polite_get(WIKIDATA_API, params=params, timeout=20)
+        r.raise_for_status()
+        data = r.json()
+        if data.get("error") and len(chunk) > 1:
+            for qid in chunk:
+                out.update(wikidata_revisions([qid]))
+            continue
+        for ent_id, ent in data.get("entities", {}).items():
+            src = (ent.get("redirects") or {}).get("from") or ent_id
+            out[src] = ent.get("lastrevid")
+    return out
+
 def wikidata_entity(qid):
     if not qid: return None
-    key = f"entity:{qid}"
-    cached = _cached(key)
-    if cached is not None:
-        return cached
-    _polite()
-    params = {"action":"wbgetentities","format":"json","ids":qid,"props":"claims|labels|descriptions"}
-    r = _session.get(WIKIDATA_API, params=params, timeout=12)
-    r.raise_for_status()
-    data = r.json()
-    ent = data.get("entities", {}).get(qid)
-    _set_cache(key, ent)
-    return ent
+    return wikidata_entities([qid]).get(qid)
 
 def _claim_value(entity, pid):
     if not entity: return None
@@ -87,62 +572,128 @@ def _claim_value(entity, pid):
     return None
 
 # --- Commons helpers ---
-def commons_meta(filename):
-    if not filename:
-        return None
+def _commons_name(filename):
     fn = filename
     if fn.lower().startswith("file:"):
         fn = fn.split(":",1)[1]
-    key = f"commons:{fn}"
-    cached = _cached(key)
-    if cached is not None:
-        return cached
-    _polite()
-    params = {"action":"query","format":"json","titles":f"File:{fn}","prop":"imageinfo","iiprop":"url|extmetadata"}
-    r = _session.get(COMMONS_API, params=params, timeout=12)
-    r.raise_for_status()
-    data = r.json()
-    pages = data.get("query", {}).get("pages", {})
+    return fn
+
+def _commons_meta_from_page(fn, page):
     file_page = f"https://commons.wikimedia.org/wiki/File:{fn}"
     author = "Wikimedia contributor"
     license = "CC"
     file_url = None
-    for p in pages.values():
-        iinfo = p.get("imageinfo")
-        if iinfo:
-            ii = iinfo[0]
-            file_url = ii.get("url")
-            ext = ii.get("extmetadata", {}) or {}
-            artist = ext.get("Artist", {}).get("value") if ext.get("Artist") else None
-            credit = ext.get("Credit", {}).get("value") if ext.get("Credit") else None
-            license_short = ext.get("LicenseShortName", {}).get("value") if ext.get("LicenseShortName") else None
-            license_url = ext.get("LicenseUrl", {}).get("value") if ext.get("LicenseUrl") else None
-            author = artist or credit or author
-            if license_short and license_url:
-                license = f"{license_short} ({license_url})"
-            elif license_short:
-                license = license_short
-            break
-    meta = {"file_page": file_page, "author": author, "license": license, "file_url": file_url}
-    _set_cache(key, meta)
+    timestamp = None
+    iinfo = (page or {}).get("imageinfo")
+    if iinfo:
+        ii = iinfo[0]
+        file_url = ii.get("url")
+        timestamp = ii.get("timestamp")
+        ext = ii.get("extmetadata", {}) or {}
+        artist = ext.get("Artist", {}).get("value") if ext.get("Artist") else None
+        credit = ext.get("Credit", {}).get("value") if ext.get("Credit") else None
+        license_short = ext.get("LicenseShortName", {}).get("value") if ext.get("LicenseShortName") else None
+        license_url = ext.get("LicenseUrl", {}).get("value") if ext.get("LicenseUrl") else None
+        author = artist or credit or author
+        if license_short and license_url:
+            license = f"{license_short} ({license_url})"
+        elif license_short:
+            license = license_short
+    return {"file_page": file_page, "author": author, "license": license, "file_url": file_url, "timestamp": timestamp}
+
+def _commons_pages(names, iiprop):
+    # imageinfo for File: names in COMMONS_BATCH-sized queries; follows
+    # continuation and maps normalized/redirected titles back. {name: page}
+    out = {}
+    for i in range(0, len(names), COMMONS_BATCH):
+        chunk = names[i:i + COMMONS_BATCH]
+        params = _commons_params(chunk, iiprop)
+        pages = {}
+        aliases = {}
+        while params:
+            r = polite_get(COMMONS_API, params=params, timeout=20)
+            r.raise_for_status()
+            params = _merge_commons_response(params, r.json(), pages, aliases)
+        out.update(_commons_chunk_pages(chunk, pages, aliases))
+    return out
+
+def _commons_params(chunk, iiprop):
+    return {"action":"query","format":"json","titles":"|".join(f"File:{fn}" for fn in chunk),"prop":"imageinfo","iiprop":iiprop,"redirects":1}
+
+def _merge_commons_response(params, data, pages, aliases):
+    # collects one response into pages/aliases; returns the params of the
+    # continuation request, or None when the query is complete
+    q = data.get("query", {})
+    for n in q.get("normalized", []) + q.get("redirects", []):
+        aliases[n.get("from")] = n.get("to")
+    for p in q.get("pages", {}).values():
+        title = p.get("title")
+        if title in pages and not p.get("imageinfo"):
+            continue
+        pages[title] = p
+    return {**params, **data["continue"]} if "continue" in data else None
+
+def _commons_chunk_pages(chunk, pages, aliases):
+    out = {}
+    for fn in chunk:
+        title = f"File:{fn}"
+        seen = set()
+        while title in aliases and title not in seen:
+            seen.add(title)
+            title = aliases[title]
+        out[fn] = pages.get(title)
+    return out
+
+def commons_meta_many(filenames):
+    # Batched imageinfo: up to COMMONS_BATCH pipe-separated titles per query.
+    # Returns {filename as passed: meta}.
+    out = {}
+    metas = {}
+    missing = []
+    for filename in filenames:
+        if not filename:
+            continue
+        fn = _commons_name(filename)
+        if fn in metas or fn in missing:
+            continue
+        cached = _cached(f"commons:{fn}", _MISS)
+        if cached is not _MISS:
+            metas[fn] = cached
+        else:
+            missing.append(fn)
+    for fn, page in _commons_pages(missing, "url|timestamp|extmetadata").items():
+        metas[fn] = _cache_commons_meta(fn, page)
+    for filename in filenames:
+        if filename:
+            out[filename] = metas.get(_commons_name(filename))
+    return out
+
+def _cache_commons_meta(fn, page):
+    # Meta for a queried file. A page Commons didn't return at all (error
+    # body) gives None and is not cached; a missing page is cached negative.
+    if page is None:
+        return None
+    meta = _commons_meta_from_page(fn, page)
+    _set_cache(f"commons:{fn}", meta)
     return meta
 
-def _filepath_for_commons(filename, width):
-    fn = filename
-    if fn.lower().startswith("file:"):
-        fn = fn.split(":",1)[1]
-    return f"https://commons.wikimedia.org/wiki/Special:FilePath/{urlquote(fn)}?width={int(width)}"
+def commons_timestamps(filenames):
+    # Current upload timestamp per file, never cached (used to detect changes).
+    names = list(dict.fromkeys(_commons_name(f) for f in filenames if f))
+    pages = _commons_pages(names, "timestamp")
+    return {fn: ((pages.get(fn) or {}).get("imageinfo") or [{}])[0].get("timestamp") for fn in names}
 
-# --- Image resolution (QID-based) ---
-def player_image_by_qid(qid, width=800):
-    if not qid:
+def commons_meta(filename):
+    if not filename:
         return None
-    key = f"player_image_by_qid:{qid}:{width}"
-    cached = _cached(key)
-    if cached is not None:
-        return cached
+    return commons_meta_many([filename]).get(filename)
 
-    ent = wikidata_entity(qid)
+def _filepath_for_commons(filename, width):
+    fn = _commons_name(filename)
+    return f"{COMMONS_FILEPATH}{urlquote(fn)}?width={int(width)}"
+
+# --- Image resolution (QID-based) ---
+def _image_record(qid, ent, clubs, metas, width):
     name = None
     if ent:
         labels = ent.get("labels", {})
@@ -160,7 +711,7 @@ def player_image_by_qid(qid, width=800):
     p18 = _claim_value(ent, "P18")
     if p18:
         filename = p18
-        file_meta = commons_meta(filename) or {}
+        file_meta = metas.get(filename) or {}
         image_url = _filepath_for_commons(filename, width)
         file_page = file_meta.get("file_page")
         author = file_meta.get("author")
@@ -170,11 +721,11 @@ def player_image_by_qid(qid, width=800):
         # fallback: current club P54 -> club logo P154
         club_qid = _claim_value(ent, "P54")
         if club_qid:
-            club_ent = wikidata_entity(club_qid)
+            club_ent = clubs.get(club_qid)
             logo_fn = _claim_value(club_ent, "P154")
             if logo_fn:
                 filename = logo_fn
-                file_meta = commons_meta(filename) or {}
+                file_meta = metas.get(filename) or {}
                 image_url = _filepath_for_commons(filename, min(width, 400))
                 file_page = file_meta.get("file_page")
                 author = file_meta.get("author")
@@ -188,7 +739,7 @@ def player_image_by_qid(qid, width=800):
         license = "CC"
         source = "fallback"
 
-    rec = {
+    return {
         "name": name or qid,
         "qid": qid,
         "filename": filename,
@@ -198,8 +749,69 @@ def player_image_by_qid(qid, width=800):
         "license": license,
         "source": source
     }
-    _set_cache(key, rec)
-    return rec
+
+def player_images_by_qids(qids, width=800):
+    # Bulk variant of player_image_by_qid: one batched pass for the players,
+    # a second for the clubs (P54) of players without their own image, and
+    # a third for the Commons metadata of the chosen files.
+    out = {}
+    todo = []
+    for qid in qids:
+        if not qid or qid in out or qid in todo:
+            continue
+        cached = _cached(f"player_image_by_qid:{qid}:{width}")
+        if cached is not None:
+            out[qid] = cached
+        else:
+            todo.append(qid)
+    if not todo:
+        return out
+
+    ents = wikidata_entities(todo)
+    club_qids = _fallback_clubs(todo, ents)
+    clubs = wikidata_entities(club_qids) if club_qids else {}
+
+    # one more batched pass for the license/author metadata of every P18/P154 file
+    metas = commons_meta_many(_image_files(todo, ents, clubs))
+
+    for qid in todo:
+        rec = _image_record(qid, ents.get(qid), clubs, metas, width)
+        _cache_image_record(qid, rec, ents, clubs, metas, width)
+        out[qid] = rec
+    return out
+
+def _cache_image_record(qid, rec, ents, clubs, metas, width):
+    # Records built on a failed lookup (entity, club or file left out of the
+    # batch results) are not cached; fallbacks get the negative TTL.
+    if qid not in ents:
+        return
+    club_qid = None if _claim_value(ents[qid], "P18") else _claim_value(ents[qid], "P54")
+    if club_qid and club_qid not in clubs:
+        return
+    if rec["source"] in ("player", "club") and metas.get(rec["filename"]) is None:
+        return
+    _set_cache(f"player_image_by_qid:{qid}:{width}", rec)
+
+def _fallback_clubs(qids, ents):
+    # P54 clubs of the players without a P18 image of their own
+    clubs = []
+    for qid in qids:
+        ent = ents.get(qid)
+        if not _claim_value(ent, "P18"):
+            club_qid = _claim_value(ent, "P54")
+            if club_qid:
+                clubs.append(club_qid)
+    return clubs
+
+def _image_files(qids, ents, clubs):
+    files = [_claim_value(ents.get(qid), "P18") for qid in qids]
+    files += [_claim_value(ent, "P154") for ent in clubs.values()]
+    return [f for f in files if f]
+
+def player_image_by_qid(qid, width=800):
+    if not qid:
+        return None
+    return player_images_by_qids([qid], width=width).get(qid)
 
 def player_image(name, width=800):
     if not name:
@@ -212,7 +824,7 @@ def player_image(name, width=800):
 def club_logo(club_name, width=400):
     if not club_name:
         return {"name": club_name, "qid": None, "filename": None, "image_url": FALLBACK_LOCAL, "file_page": None, "author": "Wikimedia contributor", "license": "CC", "source": "fallback"}
-    qid = wikidata_id_for(club_name)
+    qid = wikidata_id_for(club_name, alias=False)
     if not qid:
         return {"name": club_name, "qid": None, "filename": Path(FALLBACK_LOCAL).name, "image_url": FALLBACK_LOCAL, "file_page": None, "author": "Wikimedia contributor", "license": "CC", "source": "fallback"}
     ent = wikidata_entity(qid)
@@ -223,48 +835,313 @@ def club_logo(club_name, width=400):
     return {"name": club_name, "qid": qid, "filename": Path(FALLBACK_LOCAL).name, "image_url": FALLBACK_LOCAL, "file_page": None, "author": "Wikimedia contributor", "license": "CC", "source": "fallback"}
 
 # --- save & attribution ---
+# Each output folder keeps a manifest (target name -> source url, validators,
+# size, sha256) so re-runs send conditional requests, a URL already fetched in
+# this run is linked to its other targets without another request, files with
+# identical content are hard-linked instead of stored twice, and every write
+# goes through a temp file + atomic rename. Manifests are written every
+# MANIFEST_FLUSH_EVERY entries and by flush_manifests() (at exit, and at the
+# end of a fetch_all_players run).
+MANIFEST_NAME = ".manifest.json"
+MANIFEST_FLUSH_EVERY = 500
+
+class _Manifest:
+    def __init__(self, out):
+        self.path = out / MANIFEST_NAME
+        try:
+            self.entries = json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            self.entries = {}
+        self.by_sha = {e["sha256"]: name for name, e in self.entries.items() if e.get("sha256")}
+        self.by_url = {e["url"]: name for name, e in self.entries.items() if e.get("url")}
+        self.fetched = set()  # urls already fetched/validated in this process
+        self._dirty = 0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._target_locks = {}
+    def target_lock(self, name):
+        with self._lock:
+            return self._target_locks.setdefault(name, threading.Lock())
+    def get(self, name):
+        with self._lock:
+            return self.entries.get(name)
+    def twin(self, sha, name):
+        with self._lock:
+            other = self.by_sha.get(sha)
+        if other and other != name and (self.path.parent / other).exists():
+            return self.path.parent / other
+        return None
+    def fetched_as(self, url, name):
+        # (other target name, its entry) when url was fetched/validated in this
+        # process for another target that is still on disk
+        with self._lock:
+            other = self.by_url.get(url) if url in self.fetched else None
+            entry = self.entries.get(other) if other else None
+        if other and other != name and entry and (self.path.parent / other).exists():
+            return other, entry
+        return None
+    def put(self, name, entry):
+        with self._lock:
+            self.entries[name] = entry
+            if entry.get("sha256"):
+                self.by_sha[entry["sha256"]] = name
+            if entry.get("url"):
+                self.by_url[entry["url"]] = name
+            self._dirty += 1
+            due = self._dirty >= MANIFEST_FLUSH_EVERY
+        if due:
+            self.flush()
+    def flush(self):
+        # snapshot and write under a lock of its own, so workers adding
+        # entries never wait on the disk
+        with self._flush_lock:
+            with self._lock:
+                if not self._dirty:
+                    return
+                data = json.dumps(self.entries, ensure_ascii=False, indent=1)
+                self._dirty = 0
+            if not self.path.parent.is_dir():  # output folder removed since
+                return
+            tmp = self.path.with_name(self.path.name + ".tmp")
+            tmp.write_text(data, encoding="utf-8")
+            os.replace(tmp, self.path)
+
+_manifests = {}
+_manifests_lock = threading.Lock()
+
+def _manifest_for(out):
+    key = str(out.resolve())
+    with _manifests_lock:
+        m = _manifests.get(key)
+        if m is None:
+            m = _manifests[key] = _Manifest(out)
+        return m
+
+def flush_manifests():
+    # write every manifest with unsaved entries
+    with _manifests_lock:
+        manifests = list(_manifests.values())
+    for m in manifests:
+        m.flush()
+
+atexit.register(flush_manifests)
+
+def _link_or_copy(src, tmp):
+    # tmp becomes a hard link to src, or a copy where links aren't possible
+    tmp.unlink(missing_ok=True)
+    try:
+        os.link(src, tmp)
+    except OSError:
+        shutil.copyfile(src, tmp)
+
+def _sha256(path):
+    h = hashlib.sha256()
+    with path.open("rb") as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def _copy_local(src, target, manifest):
+    if not src.exists():
+        return None
+    st = src.stat()
+    entry = manifest.get(target.name)
+    if entry and target.exists() and entry.get("url") == str(src) and entry.get("size") == st.st_size and entry.get("mtime") == st.st_mtime:
+        metrics.inc("downloads_total", result="local_unchanged")
+        return target
+    metrics.inc("downloads_total", result="local_copied")
+    tmp = target.with_name(target.name + ".part")
+    shutil.copyfile(src, tmp)  # sendfile/copy_file_range where available, no full read into memory
+    os.replace(tmp, target)
+    manifest.put(target.name, {"url": str(src), "size": st.st_size, "mtime": st.st_mtime})
+    return target
+
+def _download(url, target, manifest):
+    # one fetch per URL at a time, so other targets of that URL can reuse it
+    with manifest.target_lock("url:" + url):
+        return _download_locked(url, target, manifest)
+
+def _download_locked(url, target, manifest):
+    shared = manifest.fetched_as(url, target.name)
+    if shared:
+        other, other_entry = shared
+        entry = manifest.get(target.name)
+        if not (entry and entry.get("sha256") == other_entry.get("sha256") and target.exists()):
+            tmp = target.with_name(target.name + ".part")
+            _link_or_copy(manifest.path.parent / other, tmp)
+            os.replace(tmp, target)
+        manifest.put(target.name, dict(other_entry))
+        metrics.inc("downloads_total", result="linked")
+        return target
+    entry = manifest.get(target.name)
+    have = bool(entry and entry.get("url") == url and target.exists()
+                and target.stat().st_size == entry.get("size") and _sha256(target) == entry.get("sha256"))
+    if have and url in manifest.fetched:
+        metrics.inc("downloads_total", result="reused")
+        return target
+    headers = {}
+    if have and entry.get("etag"):
+        headers["If-None-Match"] = entry["etag"]
+    if have and entry.get("last_modified"):
+        headers["If-Modified-Since"] = entry["last_modified"]
+    resp = polite_get(url, stream=True, timeout=20, headers=headers)
+    if resp.status_code == 304 and have:
+        manifest.fetched.add(url)
+        metrics.inc("downloads_total", result="not_modified")
+        return target
+    resp.raise_for_status()
+    tmp = target.with_name(target.name + ".part")
+    try:
+        h = hashlib.sha256()
+        size = 0
+        with tmp.open("wb") as f:
+            for chunk in resp.iter_content(8192):
+                if chunk:
+                    f.write(chunk)
+                    h.update(chunk)
+                    size += len(chunk)
+        metrics.inc("download_bytes_total", size)
+        sha = h.hexdigest()
+        if have and sha == entry.get("sha256"):
+            metrics.inc("downloads_total", result="unchanged")
+            tmp.unlink()
+        else:
+            metrics.inc("downloads_total", result="written")
+            twin = manifest.twin(sha, target.name)
+            if twin:
+                _link_or_copy(twin, tmp)
+            os.replace(tmp, target)
+    finally:
+        if tmp.exists():
+            tmp.unlink()
+    manifest.put(target.name, {"url": url, "etag": resp.headers.get("ETag"), "last_modified": resp.headers.get("Last-Modified"),
+                               "size": size, "sha256": sha})
+    manifest.fetched.add(url)
+    return target
+
+def target_name(record):
+    # file name a record is saved under in its output folder
+    fname = record.get("filename") or _norm(record.get("name","unknown")).replace(" ","_")
+    return "".join(c for c in fname if c.isalnum() or c in "._-() ").strip()
+
 def save_player_image(record, out_dir="player_images"):
     out = Path(out_dir)
     out.mkdir(parents=True, exist_ok=True)
     url = record.get("image_url")
-    fname = record.get("filename") or _norm(record.get("name","unknown")).replace(" ","_")
-    safe_name = "".join(c for c in fname if c.isalnum() or c in "._-() ").strip()
+    safe_name = target_name(record)
     target = out / safe_name
     if not url:
         return None
-    if str(url).startswith("/"):
-        src = Path(url.lstrip("/"))
+    manifest = _manifest_for(out)
+    with manifest.target_lock(safe_name):
         try:
-            if src.exists():
-                with src.open("rb") as rf, target.open("wb") as wf:
-                    wf.write(rf.read())
-                return target
-            return None
+            if str(url).startswith("/"):
+                return _copy_local(Path(url.lstrip("/")), target, manifest)
+            return _download(url, target, manifest)
         except Exception:
             return None
-    try:
-        _polite()
-        resp = _session.get(url, stream=True, timeout=20)
-        resp.raise_for_status()
-        with target.open("wb") as f:
-            for chunk in resp.iter_content(8192):
-                if chunk:
-                    f.write(chunk)
-        return target
-    except Exception:
-        return None
+
+ATTRIBUTION_FIELDS = ["name", "qid", "filename", "file_page", "author", "license", "source", "image_url", "_saved_path"]
 
 def save_attributions(records, csv_path="player_images/attribution.csv"):
     p = Path(csv_path)
     p.parent.mkdir(parents=True, exist_ok=True)
-    header = ["name", "qid", "filename", "file_page", "author", "license", "source", "image_url", "_saved_path"]
-    with p.open("w", newline="", encoding="utf-8") as f:
+    tmp = p.with_name(p.name + ".tmp")
+    with tmp.open("w", newline="", encoding="utf-8") as f:
         w = csv.writer(f)
-        w.writerow(header)
+        w.writerow(ATTRIBUTION_FIELDS)
         for r in records:
-            w.writerow([r.get("name"), r.get("qid"), r.get("filename"), r.get("file_page"), r.get("author"), r.get("license"), r.get("source"), r.get("image_url"), r.get("_saved_path","")])
+            w.writerow([r.get(k, "" if k == "_saved_path" else None) for k in ATTRIBUTION_FIELDS])
+    os.replace(tmp, p)
     return p
 
+class AttributionStore:
+    # SQLite table of attributions that outlives single runs: one row per
+    # player (QID, or normalized name without one) upserted as records
+    # complete, whichever mode found them, indexed by qid, filename and
+    # league, exported to CSV/JSON for any set of leagues.
+    COLUMNS = ["name", "qid", "filename", "file_page", "author", "license", "source", "image_url", "saved_path", "league_code", "club"]
+
+    def __init__(self, path):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(path), isolation_level=None, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS attribution (key TEXT PRIMARY KEY, "
+                         + ", ".join(f"{c} TEXT" for c in self.COLUMNS) + ", updated REAL)")
+        for col in ("qid", "filename", "league_code"):
+            self._db.execute(f"CREATE INDEX IF NOT EXISTS attribution_{col} ON attribution ({col})")
+
+    @staticmethod
+    def _key(record):
+        return record.get("qid") or "name:" + _norm(record.get("name"))
+
+    def _row(self, record, league_code=None, club=None):
+        league_code = (league_code or record.get("league_code") or "").upper()
+        values = {k: record.get(k) for k in self.COLUMNS}
+        values.update(saved_path=record.get("_saved_path", ""), league_code=league_code, club=club or record.get("club"))
+        return (self._key(record), *[values[c] for c in self.COLUMNS], time.time())
+
+    def upsert(self, record, league_code=None, club=None):
+        self.upsert_many([record], league_code, club)
+
+    def upsert_many(self, records, league_code=None, club=None):
+        rows = [self._row(r, league_code, club) for r in records if r]
+        cols = ["key", *self.COLUMNS, "updated"]
+        sql = (f"INSERT INTO attribution ({', '.join(cols)}) VALUES ({', '.join('?' * len(cols))}) "
+               f"ON CONFLICT(key) DO UPDATE SET " + ", ".join(f"{c} = excluded.{c}" for c in cols[1:]))
+        with self._lock:
+            if self._db is None:  # closed under a worker abandoned at a deadline
+                return
+            self._db.execute("BEGIN")
+            self._db.executemany(sql, rows)
+            self._db.execute("COMMIT")
+
+    def _select(self, where="", args=()):
+        with self._lock:
+            cur = self._db.execute(f"SELECT {', '.join(self.COLUMNS)} FROM attribution {where} ORDER BY league_code, club, name", args)
+            rows = cur.fetchall()
+        out = []
+        for row in rows:
+            rec = dict(zip(self.COLUMNS, row))
+            rec["_saved_path"] = rec.pop("saved_path") or ""
+            out.append(rec)
+        return out
+
+    def by_qid(self, qid):
+        return self._select("WHERE qid = ?", (qid,))
+
+    def by_filename(self, filename):
+        return self._select("WHERE filename = ?", (filename,))
+
+    def records(self, leagues=None):
+        if not leagues:
+            return self._select()
+        codes = [c.upper() for c in leagues]
+        return self._select(f"WHERE league_code IN ({', '.join('?' * len(codes))})", codes)
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM attribution").fetchone()[0]
+
+    def export_csv(self, csv_path, leagues=None):
+        return save_attributions(self.records(leagues), csv_path)
+
+    def export_json(self, json_path, leagues=None):
+        p = Path(json_path)
+        p.parent.mkdir(parents=True, exist_ok=True)
+        tmp = p.with_name(p.name + ".tmp")
+        tmp.write_text(json.dumps(self.records(leagues), ensure_ascii=False, indent=2), encoding="utf-8")
+        os.replace(tmp, p)
+        return p
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
 # --- HTML helper ---
 def figure_html(record, alt=None, width=800, height=None):
     img_src = record.get("image_url", "")
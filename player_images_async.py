@@ -0,0 +1,281 @@
+# File: player_images_async.py
+# asyncio front end for player_images: the same lookups, cache, rate limits
+# and metrics. API requests go through a pooled aiohttp session (keep-alive,
+# capped concurrency per host); without aiohttp installed they run on
+# player_images' requests.Session in worker threads. Concurrent calls that
+# need the same cache key share one in-flight request, and ids asked for in
+# the same loop iteration go out in one batched request. Image downloads
+# always run player_images.save_player_image in a worker thread, so the
+# manifest and its locks stay in one place.
+#
+#   async with AsyncClient() as client:
+#       rec = await player_image_by_qid("Q11571", client=client)
+#       await save_player_image(rec, "player_images", client=client)
+#
+# The synchronous functions in player_images are unchanged.
+
+import asyncio
+import time
+import weakref
+from urllib.parse import urlparse
+from pathlib import Path
+
+try:
+    import aiohttp
+except ImportError:  # optional: fall back to the sync session in threads
+    aiohttp = None
+
+import player_images as pi
+from pipeline_metrics import metrics
+
+HOST_CONCURRENCY = 8  # requests in flight per host
+
+class AsyncClient:
+    def __init__(self, host_concurrency=HOST_CONCURRENCY, session=None):
+        self.host_concurrency = host_concurrency
+        self._session = session
+        self._own_session = session is None
+        self._sems = {}
+        self._inflight = {}  # cache key -> future whose result dict holds that key
+        self._batches = {}   # batch name -> (ids, future) not sent yet
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def close(self):
+        if self._session is not None and self._own_session:
+            await self._session.close()
+        self._session = None
+
+    def _http(self):
+        if self._session is None and aiohttp is not None:
+            connector = aiohttp.TCPConnector(limit_per_host=self.host_concurrency, keepalive_timeout=30)
+            self._session = aiohttp.ClientSession(connector=connector, headers={"User-Agent": pi.USER_AGENT})
+        return self._session
+
+    def _sem(self, url):
+        host = urlparse(url).netloc
+        if host not in self._sems:
+            self._sems[host] = asyncio.Semaphore(self.host_concurrency)
+        return self._sems[host]
+
+    # --- request coalescing ---
+    def pending(self, key):
+        return self._inflight.get(key)
+
+    def batched(self, batch, ids, key_for, fetch):
+        # Queue ids on `batch`; everything queued before the loop gets to the
+        # flush goes out as one fetch(ids) -> {id: value} call.
+        loop = asyncio.get_running_loop()
+        pending = self._batches.get(batch)
+        if pending is None:
+            pending = self._batches[batch] = ([], loop.create_future())
+            loop.call_soon(self._flush, batch, key_for, fetch)
+        pending[0].extend(ids)
+        for i in ids:
+            self._inflight[key_for(i)] = pending[1]
+        return pending[1]
+
+    def _flush(self, batch, key_for, fetch):
+        ids, fut = self._batches.pop(batch)
+        def done(task):
+            for i in ids:
+                if self._inflight.get(key_for(i)) is fut:
+                    del self._inflight[key_for(i)]
+            if task.cancelled():
+                fut.cancel()
+            elif task.exception() is not None:
+                fut.set_exception(task.exception())
+            else:
+                fut.set_result(task.result())
+        asyncio.ensure_future(fetch(ids)).add_done_callback(done)
+
+    def share(self, keys, coro):
+        # run coro once; callers asking for any of `keys` meanwhile await the
+        # same task (its result is a dict keyed like the cache keys' ids)
+        task = asyncio.ensure_future(coro)
+        for key in keys:
+            self._inflight[key] = task
+        def done(_):
+            for key in keys:
+                if self._inflight.get(key) is task:
+                    del self._inflight[key]
+        task.add_done_callback(done)
+        return task
+
+    # --- HTTP ---
+    async def get_json(self, url, params=None, timeout=20):
+        if url in (pi.WIKIDATA_API, pi.COMMONS_API) and params is not None:
+            params = {**params, "maxlag": pi.MAXLAG}
+        async with self._sem(url):
+            if self._http() is None:
+                r = await asyncio.to_thread(pi.polite_get, url, params=params, timeout=timeout)
+                r.raise_for_status()
+                return r.json()
+            return await self._aio_get_json(url, params, timeout)
+
+    async def _aio_get_json(self, url, params, timeout):
+        # same retry policy as player_images.polite_get, without blocking the loop
+        bucket = pi._limiter.bucket(url)
+        endpoint = pi._endpoint(url, params)
+        params = {k: str(v) for k, v in (params or {}).items()}
+        for attempt in range(pi.MAX_RETRIES + 1):
+            wait = bucket.reserve()
+            metrics.observe("rate_limit_wait_seconds", wait, endpoint=endpoint)
+            if wait > 0:
+                await asyncio.sleep(wait)
+            metrics.inc("http_requests_total", endpoint=endpoint)
+            t = time.perf_counter()
+            try:
+                async with self._session.get(url, params=params, timeout=aiohttp.ClientTimeout(total=timeout)) as resp:
+                    retry = resp.status in (429, 503) or resp.headers.get("MediaWiki-API-Error") == "maxlag"
+                    if not retry or attempt == pi.MAX_RETRIES:
+                        if retry:
+                            metrics.inc("http_errors_total", endpoint=endpoint, reason=str(resp.status))
+                        resp.raise_for_status()
+                        return await resp.json(content_type=None)
+                    reason = "maxlag" if resp.status not in (429, 503) else str(resp.status)
+                    metrics.inc("http_retries_total", endpoint=endpoint, reason=reason)
+                    delay = pi._retry_after(resp)
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                metrics.inc("http_errors_total", endpoint=endpoint, reason="connection")
+                if attempt == pi.MAX_RETRIES:
+                    raise
+                metrics.inc("http_retries_total", endpoint=endpoint, reason="connection")
+                delay = None
+            finally:
+                metrics.observe("http_request_seconds", time.perf_counter() - t, endpoint=endpoint)
+            bucket.pause(delay if delay is not None else pi._backoff(attempt))
+
+_clients = weakref.WeakKeyDictionary()  # event loop -> default client
+
+def default_client():
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        client = _clients[loop] = AsyncClient()
+    return client
+
+async def close_default_client():
+    client = _clients.pop(asyncio.get_running_loop(), None)
+    if client:
+        await client.close()
+
+async def _gather_shared(client, batch, ids, key_for, fetch):
+    # ids -> {id: value}: cache first, then in-flight requests, then the
+    # rest is queued on the client's `batch`
+    out, waits, missing = {}, {}, []
+    for i in ids:
+        if not i or i in out or i in waits or i in missing:
+            continue
+        cached = pi._cached(key_for(i), pi._MISS)
+        if cached is not pi._MISS:
+            out[i] = cached
+        elif client.pending(key_for(i)) is not None:
+            waits[i] = client.pending(key_for(i))
+        else:
+            missing.append(i)
+    if missing:
+        fut = client.batched(batch, missing, key_for, fetch)
+        for i in missing:
+            waits[i] = fut
+    for i, task in waits.items():
+        res = await asyncio.shield(task)
+        if i in res:  # ids a failed request left out stay out (and uncached)
+            out[i] = res[i]
+    return out
+
+# --- Wikidata ---
+async def _fetch_entities(client, qids):
+    async def chunk_of(chunk):
+        ents = pi._entities_from_response(chunk, await client.get_json(pi.WIKIDATA_API, pi._entities_params(chunk)))
+        if ents is None:
+            # one bad id fails the batch; retry them one by one
+            ents = {}
+            for part in await asyncio.gather(*(chunk_of([q]) for q in chunk)):
+                ents.update(part)
+        return ents
+    out = {}
+    chunks = [qids[i:i + pi.WIKIDATA_BATCH] for i in range(0, len(qids), pi.WIKIDATA_BATCH)]
+    for part in await asyncio.gather(*(chunk_of(c) for c in chunks)):
+        out.update(part)
+    return out
+
+async def wikidata_entities(qids, client=None):
+    client = client or default_client()
+    return await _gather_shared(client, "entity", list(qids), lambda q: f"entity:{q}", lambda missing: _fetch_entities(client, missing))
+
+async def wikidata_entity(qid, client=None):
+    if not qid: return None
+    return (await wikidata_entities([qid], client=client)).get(qid)
+
+# --- Commons ---
+async def _fetch_commons(client, names):
+    async def chunk_of(chunk):
+        params, pages, aliases = pi._commons_params(chunk, "url|timestamp|extmetadata"), {}, {}
+        while params:
+            params = pi._merge_commons_response(params, await client.get_json(pi.COMMONS_API, params), pages, aliases)
+        metas = {}
+        for fn, page in pi._commons_chunk_pages(chunk, pages, aliases).items():
+            metas[fn] = pi._cache_commons_meta(fn, page)
+        return metas
+    out = {}
+    chunks = [names[i:i + pi.COMMONS_BATCH] for i in range(0, len(names), pi.COMMONS_BATCH)]
+    for part in await asyncio.gather(*(chunk_of(c) for c in chunks)):
+        out.update(part)
+    return out
+
+async def commons_meta_many(filenames, client=None):
+    client = client or default_client()
+    filenames = [f for f in filenames if f]
+    metas = await _gather_shared(client, "commons", [pi._commons_name(f) for f in filenames], lambda fn: f"commons:{fn}",
+                                 lambda missing: _fetch_commons(client, missing))
+    return {f: metas.get(pi._commons_name(f)) for f in filenames}
+
+async def commons_meta(filename, client=None):
+    if not filename:
+        return None
+    return (await commons_meta_many([filename], client=client)).get(filename)
+
+# --- Image resolution ---
+async def _resolve(client, qids, width):
+    ents = await wikidata_entities(qids, client=client)
+    club_qids = pi._fallback_clubs(qids, ents)
+    clubs = await wikidata_entities(club_qids, client=client) if club_qids else {}
+    metas = await commons_meta_many(pi._image_files(qids, ents, clubs), client=client)
+    out = {}
+    for qid in qids:
+        out[qid] = pi._image_record(qid, ents.get(qid), clubs, metas, width)
+        pi._cache_image_record(qid, out[qid], ents, clubs, metas, width)
+    return out
+
+async def player_images_by_qids(qids, width=800, client=None):
+    client = client or default_client()
+    return await _gather_shared(client, f"player_image_by_qid:{width}", list(qids), lambda q: f"player_image_by_qid:{q}:{width}",
+                                lambda missing: _resolve(client, missing, width))
+
+async def player_image_by_qid(qid, width=800, client=None):
+    if not qid:
+        return None
+    return (await player_images_by_qids([qid], width=width, client=client)).get(qid)
+
+# --- Downloads ---
+async def save_player_image(record, out_dir="player_images", client=None):
+    # The manifest, conditional requests, dedupe and atomic rename live in
+    # player_images.save_player_image; it runs in a worker thread (bounded
+    # per host like every other request), and two calls for the same URL and
+    # target file share one download. Players sharing a URL under different
+    # target names each get their file (identical content is hard-linked).
+    client = client or default_client()
+    url = (record or {}).get("image_url") or ""
+    key = f"save:{Path(out_dir) / pi.target_name(record or {})}:{url}"
+    task = client.pending(key)
+    if task is None:
+        async def run():
+            async with client._sem(url):
+                return {key: await asyncio.to_thread(pi.save_player_image, record, out_dir)}
+        task = client.share([key], run())
+    return (await asyncio.shield(task)).get(key)
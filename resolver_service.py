@@ -0,0 +1,444 @@
+#!/usr/bin/env python3
+# File: resolver_service.py
+# Long-running resolver for player_images: one process keeps the Wikidata /
+# Commons caches (and a memo of finished answers) warm and serves lookups
+# over local HTTP/JSON, so build jobs don't each start from cold.
+"""
+Resolver service and client.
+
+Server:
+  GET  /player_image?name=...&width=800
+  GET  /player_image_by_qid?qid=...&width=800
+  GET  /club_logo?club_name=...&width=400
+  GET  /wikidata_id_for?name=...&club=...
+  POST /call   {"op": "player_image", "args": {"name": "...", "width": 800}}
+  POST /batch  {"calls": [{"op": ..., "args": {...}}, ...]}  -> {"results": [...]}
+  POST /invalidate  {"qids": [...], "filenames": [...], "width": 800}
+  GET  /health, GET /stats
+
+Ops: player_image, player_image_by_qid, player_images_by_qids, club_logo,
+figure_html, wikidata_id_for, qids_by_label, players_active_2025_26_for_clubs
+(roster SPARQL), records_revisions, wikidata_revisions, commons_timestamps.
+A batch resolves all of its QID lookups in one player_images_by_qids pass.
+Lookups are memoized in memory (LRU; the player_images TTL, or
+NEGATIVE_CACHE_TTL_DAYS for "nothing there" answers) on top of the
+persistent SQLite cache (--cache-path) and the alias index (--aliases), so a
+repeated name is answered without touching either. Answers built on a failed
+Wikimedia call are not memoized, and neither are the revision checks and
+SPARQL queries. /invalidate drops the cache and memo entries of changed
+entities and files (fetch_all_players --incremental --resolver calls it
+through ResolverClient.forget()).
+
+The client (ResolverClient) only needs the standard library; it keeps one
+keep-alive connection per thread.
+
+Examples:
+python3 resolver_service.py serve --port 8808 --cache-path .cache/player_images.sqlite
+python3 resolver_service.py query --url http://127.0.0.1:8808 --name "Bukayo Saka"
+python3 fetch_all_players.py --resolver http://127.0.0.1:8808 --input-json data/players.json --out player_images
+"""
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+import argparse
+import http.client
+import json
+import threading
+import time
+
+DEFAULT_PORT = 8808
+MEMO_MAX_ENTRIES = 50000
+ALIAS_SAVE_EVERY = 200  # misses between alias index saves
+OPS = ("player_image", "player_image_by_qid", "player_images_by_qids", "club_logo", "figure_html", "wikidata_id_for",
+       "qids_by_label", "players_active_2025_26_for_clubs", "records_revisions", "wikidata_revisions", "commons_timestamps")
+GET_OPS = ("player_image", "player_image_by_qid", "club_logo", "wikidata_id_for")
+NO_MEMO = ("figure_html", "qids_by_label", "players_active_2025_26_for_clubs", "records_revisions", "wikidata_revisions",
+           "commons_timestamps")  # formatting, or has to see current data
+INT_ARGS = ("width", "height", "limit")
+
+class ResolverService:
+    """Answers ops through player_images, memoizing results by (op, args)."""
+
+    def __init__(self, cache_path=None, aliases=None, memo_size=MEMO_MAX_ENTRIES):
+        import player_images as pi  # the client side never pays for this import
+        import fetch_all_players as fap
+        self.pi = pi
+        self.fap = fap  # SPARQL rosters and label lookups
+        if cache_path:
+            pi.use_sqlite_cache(cache_path)
+        if aliases:
+            pi.use_alias_index(aliases)
+        self.memo_size = memo_size
+        self.ttl = pi.CACHE_TTL_DAYS * 86400
+        self.negative_ttl = pi.NEGATIVE_CACHE_TTL_DAYS * 86400
+        self._memo = OrderedDict()  # key -> (expires, result)
+        self._lock = threading.Lock()
+        self.stats = {"calls": 0, "memo_hits": 0, "memo_misses": 0, "errors": 0}
+        self.started = time.time()
+
+    @staticmethod
+    def _key(op, args):
+        return json.dumps([op, args], sort_keys=True, ensure_ascii=False)
+
+    def _memo_get(self, key, count=True):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._memo.get(key)
+            if not count:
+                return entry if entry is not None and entry[0] >= now else None
+            self.stats["calls"] += 1
+            if entry is None or entry[0] < now:
+                self._memo.pop(key, None)
+                self.stats["memo_misses"] += 1
+                return None
+            self._memo.move_to_end(key)
+            self.stats["memo_hits"] += 1
+            return entry
+
+    def _memo_set(self, key, result, negative=False):
+        with self._lock:
+            self._memo[key] = (time.monotonic() + (self.negative_ttl if negative else self.ttl), result)
+            self._memo.move_to_end(key)
+            while len(self._memo) > self.memo_size:
+                self._memo.popitem(last=False)
+            save = self.stats["memo_misses"] % ALIAS_SAVE_EVERY == 0
+        if save:
+            self.pi.save_aliases()
+
+    def _run(self, op, args):
+        pi = self.pi
+        if op == "player_images_by_qids":
+            return self._by_qids(args.get("qids") or [], args.get("width", 800))
+        if op == "figure_html":
+            return pi.figure_html(args.get("record") or {}, alt=args.get("alt"), width=args.get("width", 800), height=args.get("height"))
+        if op == "player_image":
+            return pi.player_image(args.get("name"), width=args.get("width", 800))
+        if op == "player_image_by_qid":
+            return pi.player_image_by_qid(args.get("qid"), width=args.get("width", 800))
+        if op == "club_logo":
+            return pi.club_logo(args.get("club_name"), width=args.get("width", 400))
+        if op == "wikidata_id_for":
+            return pi.wikidata_id_for(args.get("name"), args.get("club"), alias=args.get("alias", True) not in (False, "0", "false"))
+        if op == "qids_by_label":
+            return self._qids_by_label(args.get("pairs") or [])
+        if op == "players_active_2025_26_for_clubs":
+            return self.fap.players_active_2025_26_for_clubs(args.get("club_qids") or [], limit=args.get("limit", 200))
+        if op == "records_revisions":
+            return pi.records_revisions(args.get("records") or [])
+        if op == "wikidata_revisions":
+            return pi.wikidata_revisions(args.get("qids") or [])
+        if op == "commons_timestamps":
+            return pi.commons_timestamps(args.get("filenames") or [])
+        raise ValueError(f"unknown op {op!r}")
+
+    def _settled(self, op, args, result):
+        # Whether the answer came from data player_images kept in its cache.
+        # One built on a failed call (maxlag, a batch left out, ...) isn't, and
+        # is looked up again next time instead of being memoized.
+        cache, miss = self.pi._cache, self.pi._MISS
+        if op == "player_image_by_qid" or (op == "player_image" and result and result.get("qid")):
+            qid = args.get("qid") if op == "player_image_by_qid" else result["qid"]
+            if not qid:
+                return True
+            return cache.get(f"player_image_by_qid:{qid}:{args.get('width', 800)}", miss) is not miss
+        if op == "wikidata_id_for" and result or op == "club_logo" and result and result.get("qid"):
+            return True
+        name = args.get("club_name") if op == "club_logo" else args.get("name")
+        return not name or cache.get(f"qid:{self.pi._norm(name)}", miss) is not miss
+
+    def _negative(self, op, result):
+        if op in ("player_image_by_qid", "player_image", "club_logo"):
+            return result is None or result.get("source") == "fallback"
+        return result is None
+
+    def _by_qids(self, qids, width):
+        # player_images_by_qids memoized per QID, so batches that overlap
+        # share their answers
+        out, todo = {}, []
+        for qid in dict.fromkeys(q for q in qids if q):
+            entry = self._memo_get(self._key("player_image_by_qid", {"qid": qid, "width": width}))
+            if entry is not None:
+                out[qid] = entry[1]
+            else:
+                todo.append(qid)
+        if todo:
+            for qid, rec in self.pi.player_images_by_qids(todo, width=width).items():
+                args = {"qid": qid, "width": width}
+                if self._settled("player_image_by_qid", args, rec):
+                    self._memo_set(self._key("player_image_by_qid", args), rec, self._negative("player_image_by_qid", rec))
+                out[qid] = rec
+        return out
+
+    def _qids_by_label(self, pairs):
+        # [[name, club_qid], ...] -> [[name, club_qid, qid], ...] (JSON has no
+        # tuple keys). Names the alias index knows skip the SPARQL query.
+        pairs = [(n, c) for n, c in pairs if n]
+        out = [[n, c, self.pi.known_id_for(n, c)] for n, c in dict.fromkeys(pairs)]
+        rest = [(n, c) for n, c, q in out if not q]
+        if rest:
+            found = self.fap.qids_by_label(rest)
+            out = [[n, c, q or found.get((n, c))] for n, c, q in out]
+        return [row for row in out if row[2]]
+
+    def call(self, op, args=None):
+        args = dict(args or {})
+        for k in INT_ARGS:
+            if args.get(k) is not None:
+                args[k] = int(args[k])
+        if op in NO_MEMO or op == "player_images_by_qids":  # the latter is memoized per QID
+            return self._run(op, args)
+        key = self._key(op, args)
+        entry = self._memo_get(key)
+        if entry is not None:
+            return entry[1]
+        result = self._run(op, args)
+        if self._settled(op, args, result):
+            self._memo_set(key, result, self._negative(op, result))
+        return result
+
+    def batch(self, calls):
+        # -> one {"result": ...} or {"error": ...} per call, in order. QID
+        # lookups not memoized yet are prefetched in one batched pass.
+        by_width = {}
+        for c in calls:
+            args = c.get("args") or {}
+            if c.get("op") == "player_image_by_qid" and args.get("qid"):
+                width = int(args.get("width", 800))
+                if self._memo_get(self._key("player_image_by_qid", {**args, "width": width}), count=False) is None:
+                    by_width.setdefault(width, []).append(args["qid"])
+        for width, qids in by_width.items():
+            try:
+                self._by_qids(qids, width)
+            except Exception as e:
+                print("Batched QID lookup failed, falling back to single calls:", e)
+        out = []
+        for c in calls:
+            try:
+                out.append({"result": self.call(c.get("op"), c.get("args"))})
+            except Exception as e:
+                with self._lock:
+                    self.stats["errors"] += 1
+                out.append({"error": str(e)})
+        return out
+
+    def invalidate(self, qids=(), filenames=(), width=800):
+        # Drop the player_images cache entries and every memoized answer that
+        # mentions one of the QIDs or files, so they are looked up afresh.
+        qids, filenames = set(qids or ()), set(filenames or ())
+        self.pi.forget(qids, filenames, width=width)
+
+        def stale(result):
+            if isinstance(result, str):
+                return result in qids
+            return isinstance(result, dict) and (result.get("qid") in qids or result.get("filename") in filenames)
+
+        with self._lock:
+            drop = [k for k, (_, result) in self._memo.items() if stale(result)]
+            for k in drop:
+                del self._memo[k]
+        return {"dropped": len(drop)}
+
+    def snapshot(self):
+        with self._lock:
+            return {**self.stats, "memo_entries": len(self._memo), "uptime_s": round(time.time() - self.started, 3)}
+
+    def close(self):
+        self.pi.save_aliases()
+
+def make_server(service, host="127.0.0.1", port=DEFAULT_PORT):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def _send(self, status, obj):
+            body = json.dumps(obj, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            u = urlparse(self.path)
+            op = u.path.strip("/")
+            if op == "health":
+                return self._send(200, {"ok": True})
+            if op == "stats":
+                return self._send(200, {"resolver": service.snapshot(), "cache": service.pi.cache_stats(), "metrics": service.pi.metrics.snapshot()})
+            if op not in GET_OPS:
+                return self._send(404, {"error": f"unknown path {u.path}"})
+            args = {k: v[0] for k, v in parse_qs(u.query).items()}
+            self._answer(lambda: {"result": service.call(op, args)})
+
+        def do_POST(self):
+            u = urlparse(self.path)
+            try:
+                payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+            except ValueError as e:
+                return self._send(400, {"error": f"bad JSON: {e}"})
+            if u.path == "/call":
+                return self._answer(lambda: {"result": service.call(payload.get("op"), payload.get("args"))})
+            if u.path == "/batch":
+                return self._answer(lambda: {"results": service.batch(payload.get("calls") or [])})
+            if u.path == "/invalidate":
+                return self._answer(lambda: service.invalidate(payload.get("qids"), payload.get("filenames"), int(payload.get("width") or 800)))
+            self._send(404, {"error": f"unknown path {u.path}"})
+
+        def _answer(self, fn):
+            try:
+                self._send(200, fn())
+            except ValueError as e:
+                self._send(400, {"error": str(e)})
+            except Exception as e:
+                self._send(502, {"error": str(e)})
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    return server
+
+class ResolverError(RuntimeError):
+    pass
+
+class ResolverClient:
+    """Talks to a running resolver; mirrors the player_images functions."""
+
+    def __init__(self, url=f"http://127.0.0.1:{DEFAULT_PORT}", timeout=120):
+        u = urlparse(url)
+        self.host, self.port = u.hostname or "127.0.0.1", u.port or DEFAULT_PORT
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        return conn
+
+    def _request(self, method, path, payload=None):
+        body = json.dumps(payload).encode("utf-8") if payload is not None else None
+        headers = {"Content-Type": "application/json"} if body is not None else {}
+        for attempt in range(2):  # one retry on a dropped keep-alive connection
+            conn = self._conn()
+            try:
+                conn.request(method, path, body=body, headers=headers)
+                resp = conn.getresponse()
+                data = json.loads(resp.read() or b"{}")
+                break
+            except (http.client.HTTPException, ConnectionError):
+                conn.close()
+                self._local.conn = None
+                if attempt:
+                    raise
+        if resp.status != 200:
+            raise ResolverError(data.get("error") or f"HTTP {resp.status}")
+        return data
+
+    def call(self, op, **args):
+        return self._request("POST", "/call", {"op": op, "args": args})["result"]
+
+    def batch(self, calls):
+        # calls: [(op, {args})] -> results in order; failed calls raise
+        results = self._request("POST", "/batch", {"calls": [{"op": op, "args": args} for op, args in calls]})["results"]
+        out = []
+        for r in results:
+            if "error" in r:
+                raise ResolverError(r["error"])
+            out.append(r["result"])
+        return out
+
+    def player_image(self, name, width=800):
+        return self.call("player_image", name=name, width=width)
+
+    def player_image_by_qid(self, qid, width=800):
+        return self.call("player_image_by_qid", qid=qid, width=width)
+
+    def player_images_by_qids(self, qids, width=800):
+        return self.call("player_images_by_qids", qids=list(qids), width=width)
+
+    def club_logo(self, club_name, width=400):
+        return self.call("club_logo", club_name=club_name, width=width)
+
+    def figure_html(self, record, alt=None, width=800, height=None):
+        return self.call("figure_html", record=record, alt=alt, width=width, height=height)
+
+    def wikidata_id_for(self, name, club=None, alias=True):
+        return self.call("wikidata_id_for", name=name, club=club, alias=alias)
+
+    def qids_by_label(self, pairs, chunk=None):
+        # same shape as fetch_all_players.qids_by_label: {(name, club_qid): qid}
+        rows = self.call("qids_by_label", pairs=[list(p) for p in pairs])
+        return {(name, club): qid for name, club, qid in rows}
+
+    def players_active_2025_26_for_clubs(self, club_qids, limit=200, chunk=None):
+        return self.call("players_active_2025_26_for_clubs", club_qids=list(club_qids), limit=limit)
+
+    def records_revisions(self, records):
+        return self.call("records_revisions", records=list(records))
+
+    def wikidata_revisions(self, qids):
+        return self.call("wikidata_revisions", qids=list(qids))
+
+    def commons_timestamps(self, filenames):
+        return self.call("commons_timestamps", filenames=list(filenames))
+
+    def invalidate(self, qids=(), filenames=(), width=800):
+        return self._request("POST", "/invalidate", {"qids": list(qids), "filenames": list(filenames), "width": width})
+
+    forget = invalidate  # same signature as player_images.forget
+
+    def health(self):
+        return self._request("GET", "/health")
+
+    def stats(self):
+        return self._request("GET", "/stats")
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+def serve(host="127.0.0.1", port=DEFAULT_PORT, cache_path=None, aliases=None):
+    service = ResolverService(cache_path=cache_path, aliases=aliases)
+    server = make_server(service, host, port)
+    print(f"Resolver listening on http://{host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Warm player_images resolver over local HTTP/JSON")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    s = sub.add_parser("serve", help="Run the resolver")
+    s.add_argument("--host", default="127.0.0.1")
+    s.add_argument("--port", type=int, default=DEFAULT_PORT)
+    s.add_argument("--cache-path", default=".cache/player_images.sqlite", help="Persistent Wikidata/Commons cache ('' for memory only)")
+    s.add_argument("--aliases", default="data/name-aliases.json", help="Alias index (name -> QID); '' to disable")
+    q = sub.add_parser("query", help="Ask a running resolver")
+    q.add_argument("--url", default=f"http://127.0.0.1:{DEFAULT_PORT}")
+    q.add_argument("--name", action="append", default=[], help="Player name (repeatable)")
+    q.add_argument("--qid", action="append", default=[], help="Player QID (repeatable)")
+    q.add_argument("--club", action="append", default=[], help="Club name (repeatable)")
+    q.add_argument("--width", type=int, default=800)
+    q.add_argument("--html", action="store_true", help="Print figure_html for each result")
+    args = parser.parse_args()
+
+    if args.cmd == "serve":
+        serve(args.host, args.port, args.cache_path or None, args.aliases or None)
+        return
+    client = ResolverClient(args.url)
+    calls = ([("player_image", {"name": n, "width": args.width}) for n in args.name]
+             + [("player_image_by_qid", {"qid": x, "width": args.width}) for x in args.qid]
+             + [("club_logo", {"club_name": c, "width": args.width}) for c in args.club])
+    for rec in client.batch(calls):
+        print(client.figure_html(rec, width=args.width) if args.html else json.dumps(rec, ensure_ascii=False))
+
+if __name__ == "__main__":
+    main()
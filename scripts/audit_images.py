@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+audit_images.py
+Health check for every image the site links to: the remote image_url of each
+player in data/players.json and the logo_url of each team in teams.json.
+
+Remote URLs get a HEAD request (a 1-byte range GET when the server refuses
+HEAD or sends no size), redirects are followed by hand so each hop is
+recorded, and the checks run concurrently on a pooled session with a cap on
+requests in flight per host. Local logo paths are checked on disk.
+
+Results are cached by URL in .cache/image-audit.json for --ttl hours, so a
+re-run only re-checks stale entries. Transient failures (timeouts,
+connection errors, 429 and 5xx) only stay cached for --error-ttl hours. The report (--report, JSON) lists
+not-found URLs, redirects, oversized images (--max-bytes), non-image
+responses, errors and missing local files.
+
+Examples:
+python3 scripts/audit_images.py --report audit-images.json
+python3 scripts/audit_images.py --ttl 0 --per-host 16 --fail-on-broken
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from urllib.parse import urljoin, urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_ROOT))
+from jsonstream import iter_records  # noqa: E402
+
+PLAYERS_FILE = REPO_ROOT / "data" / "players.json"
+TEAMS_FILE = REPO_ROOT / "teams.json"
+CACHE_FILE = REPO_ROOT / ".cache" / "image-audit.json"
+REPORT_FILE = "audit-images.json"
+USER_AGENT = "footballspinner-image-audit/1.0 (https://footballspinner.com/)"
+WORKERS = 32
+PER_HOST = 8
+TIMEOUT = 15
+MAX_REDIRECTS = 5
+MAX_BYTES = 500 * 1024
+TTL_HOURS = 24
+ERROR_TTL_HOURS = 0.25
+
+def iter_targets(players_json=PLAYERS_FILE, teams_json=TEAMS_FILE):
+    # (kind, label, url_or_path) for every image reference
+    if players_json and Path(players_json).exists():
+        for p in iter_records(players_json):
+            url = (p.get("image_url") or "").strip()
+            if url:
+                yield "player", (p.get("name") or p.get("player_name") or "").strip(), url
+    if teams_json and Path(teams_json).exists():
+        for t in iter_records(teams_json):
+            url = (t.get("logo_url") or "").strip()
+            if url:
+                yield "logo", f"{t.get('league_code')}:{t.get('team_name')}", url
+
+def is_remote(url):
+    return urlparse(url).scheme in ("http", "https")
+
+class Checker:
+    """Checks remote URLs on one pooled session, PER_HOST at a time per host."""
+
+    def __init__(self, per_host=PER_HOST, workers=WORKERS, timeout=TIMEOUT):
+        self.per_host = per_host
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.headers.update({"User-Agent": USER_AGENT})
+        adapter = HTTPAdapter(pool_connections=64, pool_maxsize=max(workers, per_host))
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._sems = {}
+        self._lock = threading.Lock()
+
+    def _sem(self, url):
+        host = urlparse(url).netloc
+        with self._lock:
+            if host not in self._sems:
+                self._sems[host] = threading.BoundedSemaphore(self.per_host)
+            return self._sems[host]
+
+    def _request(self, url):
+        with self._sem(url):
+            r = self.session.head(url, allow_redirects=False, timeout=self.timeout)
+            if r.status_code in (403, 405, 501) or (r.ok and r.headers.get("Content-Length") is None):
+                r = self.session.get(url, headers={"Range": "bytes=0-0"}, allow_redirects=False,
+                                     timeout=self.timeout, stream=True)
+                r.close()
+            return r
+
+    def check(self, url):
+        t = time.perf_counter()
+        redirects = []
+        try:
+            current = url
+            for _ in range(MAX_REDIRECTS + 1):
+                r = self._request(current)
+                if r.is_redirect and r.headers.get("Location"):
+                    nxt = urljoin(current, r.headers["Location"])
+                    redirects.append({"status": r.status_code, "to": nxt})
+                    current = nxt
+                    continue
+                break
+            else:
+                return {"status": r.status_code, "final_url": current, "redirects": redirects,
+                        "error": f"more than {MAX_REDIRECTS} redirects", "elapsed_ms": round((time.perf_counter() - t) * 1000, 1)}
+            size = None
+            if r.headers.get("Content-Range", "").rpartition("/")[2].isdigit():
+                size = int(r.headers["Content-Range"].rpartition("/")[2])
+            elif r.status_code != 206 and (r.headers.get("Content-Length") or "").isdigit():
+                size = int(r.headers["Content-Length"])
+            return {"status": r.status_code, "final_url": current, "redirects": redirects, "size": size,
+                    "content_type": (r.headers.get("Content-Type") or "").split(";")[0].strip() or None,
+                    "elapsed_ms": round((time.perf_counter() - t) * 1000, 1)}
+        except requests.RequestException as e:
+            return {"status": None, "final_url": url, "redirects": redirects, "error": f"{type(e).__name__}: {e}",
+                    "elapsed_ms": round((time.perf_counter() - t) * 1000, 1)}
+
+def check_local(path, root=REPO_ROOT):
+    p = Path(path)
+    p = p if p.is_absolute() else Path(root) / p
+    if not p.is_file():
+        return {"status": "missing", "path": str(p)}
+    return {"status": "ok", "path": str(p), "size": p.stat().st_size}
+
+def is_transient(result):
+    # a failure worth re-checking soon: no response at all, rate limited, or a server error
+    status = result.get("status")
+    return status is None or status == 429 or (isinstance(status, int) and status >= 500)
+
+def load_cache(path, ttl_hours, error_ttl_hours=ERROR_TTL_HOURS):
+    if not ttl_hours or not Path(path).exists():
+        return {}
+    try:
+        data = json.loads(Path(path).read_text(encoding="utf-8"))
+    except ValueError:
+        return {}
+    now = time.time()
+    return {url: e for url, e in data.items()
+            if e.get("checked", 0) >= now - (min(ttl_hours, error_ttl_hours) if is_transient(e) else ttl_hours) * 3600}
+
+def save_cache(path, cache):
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    tmp = Path(str(path) + ".tmp")
+    tmp.write_text(json.dumps(cache, ensure_ascii=False, indent=1, sort_keys=True), encoding="utf-8")
+    os.replace(tmp, path)
+
+def classify(kind, label, url, result, max_bytes):
+    # -> report categories the entry belongs to
+    entry = {"kind": kind, "name": label, "url": url, **{k: v for k, v in result.items() if k != "checked"}}
+    status = result.get("status")
+    cats = []
+    if status == "missing":
+        cats.append("missing_local")
+    elif result.get("error"):
+        cats.append("errors")
+    elif status in (404, 410):
+        cats.append("not_found")
+    elif isinstance(status, int) and status >= 400:
+        cats.append("errors")
+    if result.get("redirects"):
+        cats.append("redirects")
+    if result.get("size") and result["size"] > max_bytes:
+        cats.append("oversized")
+    ctype = result.get("content_type")
+    if ctype and isinstance(status, int) and status < 400 and not ctype.startswith("image/"):
+        cats.append("not_image")
+    return entry, cats
+
+def audit(targets, per_host=PER_HOST, workers=WORKERS, ttl_hours=TTL_HOURS, cache_file=CACHE_FILE,
+          max_bytes=MAX_BYTES, timeout=TIMEOUT, root=REPO_ROOT, error_ttl_hours=ERROR_TTL_HOURS):
+    t0 = time.perf_counter()
+    targets = list(targets)
+    cache = load_cache(cache_file, ttl_hours, error_ttl_hours) if cache_file else {}
+    urls = {url for _, _, url in targets if is_remote(url)}
+    remote = sorted(urls - set(cache))
+    if remote:
+        checker = Checker(per_host=per_host, workers=workers, timeout=timeout)
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for url, result in zip(remote, pool.map(checker.check, remote)):
+                cache[url] = {**result, "checked": time.time()}
+    if cache_file:
+        save_cache(cache_file, cache)
+
+    report = {"generated": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()), "max_bytes": max_bytes,
+              "not_found": [], "redirects": [], "oversized": [], "not_image": [], "errors": [], "missing_local": []}
+    local_ok = 0
+    for kind, label, url in targets:
+        result = cache[url] if is_remote(url) else check_local(url, root)
+        entry, cats = classify(kind, label, url, result, max_bytes)
+        for cat in cats:
+            report[cat].append(entry)
+        local_ok += not is_remote(url) and result["status"] == "ok"
+    n_remote = sum(1 for _, _, url in targets if is_remote(url))
+    report["totals"] = {
+        "references": len(targets), "remote": n_remote, "remote_checked": len(remote),
+        "remote_cached": len(urls) - len(remote),
+        "local": len(targets) - n_remote, "local_ok": local_ok,
+        **{cat: len(report[cat]) for cat in ("not_found", "redirects", "oversized", "not_image", "errors", "missing_local")},
+        "seconds": round(time.perf_counter() - t0, 2),
+    }
+    return report
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check every player image_url and team logo_url")
+    parser.add_argument("--players", default=str(PLAYERS_FILE), help="players.json / .jsonl with image_url ('' to skip)")
+    parser.add_argument("--teams", default=str(TEAMS_FILE), help="teams.json with logo_url ('' to skip)")
+    parser.add_argument("--report", default=REPORT_FILE, help="JSON report to write")
+    parser.add_argument("--workers", type=int, default=WORKERS, help="Requests in flight overall")
+    parser.add_argument("--per-host", type=int, default=PER_HOST, help="Requests in flight per host")
+    parser.add_argument("--timeout", type=float, default=TIMEOUT, help="Per-request timeout in seconds")
+    parser.add_argument("--max-bytes", type=int, default=MAX_BYTES, help="Images above this size are reported as oversized")
+    parser.add_argument("--ttl", type=float, default=TTL_HOURS, help="Hours a cached URL result stays valid (0: re-check everything)")
+    parser.add_argument("--error-ttl", type=float, default=ERROR_TTL_HOURS, help="Hours a timeout, connection error, 429 or 5xx stays cached")
+    parser.add_argument("--cache", default=str(CACHE_FILE), help="URL result cache ('' to disable)")
+    parser.add_argument("--fail-on-broken", action="store_true", help="Exit 1 when anything is not found, errored or missing")
+    args = parser.parse_args(argv)
+
+    report = audit(iter_targets(args.players or None, args.teams or None), per_host=args.per_host, workers=args.workers,
+                   ttl_hours=args.ttl, cache_file=args.cache or None, max_bytes=args.max_bytes, timeout=args.timeout,
+                   error_ttl_hours=args.error_ttl)
+    out = Path(args.report)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(report, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+
+    t = report["totals"]
+    print("Image audit summary:")
+    print(f"- References: {t['references']} ({t['remote']} remote: {t['remote_checked']} checked, {t['remote_cached']} from cache; {t['local']} local)")
+    print(f"- Not found: {t['not_found']}, errors: {t['errors']}, missing local files: {t['missing_local']}")
+    print(f"- Redirects: {t['redirects']}, oversized (> {args.max_bytes} bytes): {t['oversized']}, not an image: {t['not_image']}")
+    print(f"- Report written to: {out}")
+    print(f"- Took {t['seconds']:.2f}s")
+    broken = t["not_found"] + t["errors"] + t["missing_local"]
+    return 1 if args.fail_on_broken and broken else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+bench_pipeline.py
+Replay a squad list through fetch_all_players.enrich_players_from_file against
+the local fake Wikimedia server (scripts/fake_wikimedia.py) and report, per
+run: requests per endpoint, bytes served, wall time and p50/p95 latency per
+stage (search, entities, imageinfo, download, sparql).
+
+Runs are offline and repeatable, so every performance change to
+player_images.py / fetch_all_players.py can be compared in CI.
+
+Example:
+python3 scripts/bench_pipeline.py --players data/players.json --workers 1,8 \\
+  --latency 0.02 --error-rate 0.01 --json bench.json
+"""
+import argparse
+import json
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_ROOT))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import player_images  # noqa: E402
+import fetch_all_players  # noqa: E402
+from fake_wikimedia import FakeWikimedia, load_fixture  # noqa: E402
+
+def _stage(url, params):
+    params = params or {}
+    if "/sparql" in url:
+        return "sparql"
+    if "Special:FilePath" in url:
+        return "download"
+    return {"wbsearchentities": "search", "wbgetentities": "entities", "query": "imageinfo"}.get(params.get("action"), "other")
+
+def percentile(values, pct):
+    if not values:
+        return None
+    values = sorted(values)
+    k = max(0, min(len(values) - 1, int(round(pct / 100.0 * len(values) + 0.5)) - 1))
+    return values[k]
+
+class TimedSession:
+    """Wraps the player_images session and records per-stage request latency."""
+
+    def __init__(self, session):
+        self._session = session
+        self.headers = session.headers
+        self.timings = {}
+
+    def get(self, url, params=None, **kwargs):
+        t = time.perf_counter()
+        try:
+            return self._session.get(url, params=params, **kwargs)
+        finally:
+            self.timings.setdefault(_stage(url, params), []).append(time.perf_counter() - t)
+
+def run_once(fake, players_json, workers, max_total, width, out, cold=True):
+    # Everything the run writes (images, club QIDs, journal) stays under out.
+    # A cold run starts from an empty out dir, cache and alias index; a warm
+    # run reuses what the cold run left behind.
+    out = Path(out)
+    if cold:
+        shutil.rmtree(out, ignore_errors=True)
+        player_images.set_cache_backend(player_images.MemoryCache())
+        player_images.use_alias_index(None)
+        player_images._manifests.clear()
+    out.mkdir(parents=True, exist_ok=True)
+    session = TimedSession(player_images._session)
+    original = player_images._session
+    player_images._session = session
+    player_images.metrics.reset()
+    fake.reset_stats()
+    t = time.perf_counter()
+    try:
+        fetch_all_players.enrich_players_from_file(players_json, out / "images", width, csv_path=out / "attribution.csv",
+                                                   out_players_json=out / "players.json", max_total=max_total, workers=workers,
+                                                   club_qids_path=out / "club-qids.json")
+    finally:
+        wall = time.perf_counter() - t
+        player_images._session = original
+    stages = {}
+    for name, values in sorted(session.timings.items()):
+        stages[name] = {"count": len(values), "p50_ms": round(percentile(values, 50) * 1000, 2),
+                        "p95_ms": round(percentile(values, 95) * 1000, 2), "total_s": round(sum(values), 3)}
+    return {"workers": workers, "wall_s": round(wall, 3), "requests": dict(sorted(fake.stats["requests"].items())),
+            "requests_total": sum(fake.stats["requests"].values()), "bytes": fake.stats["bytes"],
+            "throttled": fake.stats["throttled"], "stages": stages,
+            "counters": player_images.metrics.snapshot()["counters"]}
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmark of the player image pipeline")
+    parser.add_argument("--players", default=str(REPO_ROOT / "data" / "players.json"), help="Squad list to replay")
+    parser.add_argument("--fixture", help="Fixture JSON for the fake server (default: synthesized)")
+    parser.add_argument("--workers", default="1,8", help="Comma-separated worker counts to compare")
+    parser.add_argument("--max-total", type=int, default=None)
+    parser.add_argument("--width", type=int, default=800)
+    parser.add_argument("--latency", type=float, default=0.02, help="Fake server latency per request (s)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with 429")
+    parser.add_argument("--rate", type=float, default=1000.0, help="Requests/s allowed to the fake host by the rate limiter")
+    parser.add_argument("--warm", action="store_true", help="Also measure a second run per worker count with a warm cache")
+    parser.add_argument("--json", dest="out_json", help="Write the results to this JSON file")
+    args = parser.parse_args()
+
+    fake = FakeWikimedia(load_fixture(args.fixture), latency=args.latency, error_rate=args.error_rate)
+    fake.start()
+    fake.patch(player_images, fetch_all_players, rate=(args.rate, max(1, int(args.rate))))
+    results = []
+    work = Path(tempfile.mkdtemp(prefix="bench-"))
+    try:
+        for w in [int(x) for x in args.workers.split(",") if x.strip()]:
+            res = run_once(fake, args.players, w, args.max_total, args.width, work / f"w{w}")
+            res["cache"] = "cold"
+            results.append(res)
+            if args.warm:
+                warm = run_once(fake, args.players, w, args.max_total, args.width, work / f"w{w}", cold=False)
+                warm["cache"] = "warm"
+                results.append(warm)
+    finally:
+        fake.stop()
+        shutil.rmtree(work, ignore_errors=True)
+
+    for r in results:
+        print(f"\nworkers={r['workers']} cache={r['cache']}: {r['wall_s']}s, {r['requests_total']} requests, "
+              f"{r['bytes']} bytes, {r['throttled']} throttled")
+        for name, st in r["stages"].items():
+            print(f"  {name:<10} n={st['count']:<5} p50={st['p50_ms']}ms p95={st['p95_ms']}ms total={st['total_s']}s")
+    if args.out_json:
+        Path(args.out_json).write_text(json.dumps(results, indent=2), encoding="utf-8")
+        print("\nWrote", args.out_json)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+extract_colors.py
+Python/NumPy counterpart of extract-colors.js: extracts a primary color from
+every club logo under logos1/vendor/ (folders mapped to league codes through
+data/league-map.json) and writes data/colors.generated.json, keyed like the
+JS scripts ("EPL:arsenal fc"), so fill-colors.js can merge it.
+
+Per logo: transparent pixels are masked out, the image is downsampled to at
+most 64 px a side, pixels are quantized into a 4-bit-per-channel histogram
+whose biggest bins seed a small k-means, and the cluster with the best
+coverage x saturation score wins (near-white/grey clusters only when nothing
+else is there, so black-and-white crests stay black).
+
+Logos are processed in a process pool and results are cached by sha256 in
+.cache/logo-colors.json, so a re-run only reads new or changed files.
+
+--write also sets primary_color in teams.json for teams whose color is
+missing, invalid or the #808080 placeholder (--force: for every team).
+
+Example:
+python3 scripts/extract_colors.py --write
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+import unicodedata
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+VENDOR_DIR = REPO_ROOT / "logos1" / "vendor"
+LEAGUE_MAP = REPO_ROOT / "data" / "league-map.json"
+TEAMS_FILE = REPO_ROOT / "teams.json"
+OUT_FILE = REPO_ROOT / "data" / "colors.generated.json"
+CACHE_FILE = REPO_ROOT / ".cache" / "logo-colors.json"
+PLACEHOLDER = "#808080"
+ALGO_VERSION = 1  # bump to invalidate the cache when the extraction changes
+MAX_SIDE = 64
+CLUSTERS = 5
+
+def norm(s):
+    # same normalization as norm() in extract-colors.js / fill-colors.js
+    s = unicodedata.normalize("NFD", str(s or ""))
+    s = "".join(ch for ch in s if not unicodedata.combining(ch)).lower().replace("&", "and")
+    return re.sub(r"[^a-z0-9]+", " ", s).strip()
+
+def key(league_code, team_name):
+    return f"{str(league_code or '').upper()}:{norm(team_name)}"
+
+def is_valid_hex(v):
+    return isinstance(v, str) and re.fullmatch(r"#?[0-9a-fA-F]{6}", v.strip()) is not None
+
+def to_hex(rgb):
+    return "#" + "".join(f"{int(max(0, min(255, round(c)))):02X}" for c in rgb)
+
+def sha256(path):
+    return hashlib.sha256(Path(path).read_bytes()).hexdigest()
+
+def _pixels(path):
+    # opaque pixels of the downsampled logo, as float (n, 3)
+    with Image.open(path) as im:
+        arr = np.asarray(im.convert("RGBA"))
+    step = max(1, -(-max(arr.shape[:2]) // MAX_SIDE))
+    arr = arr[::step, ::step].reshape(-1, 4)
+    return arr[arr[:, 3] >= 128, :3].astype(np.float32)
+
+def _kmeans(px, k=CLUSTERS, iters=12):
+    # seeds: the k most populated bins of a 16x16x16 histogram (deterministic)
+    q = (px // 16).astype(np.int32)
+    codes = (q[:, 0] << 8) | (q[:, 1] << 4) | q[:, 2]
+    counts = np.bincount(codes, minlength=4096)
+    seeds = np.argsort(counts)[::-1][:k]
+    seeds = seeds[counts[seeds] > 0]
+    centers = np.stack([(seeds >> 8) & 15, (seeds >> 4) & 15, seeds & 15], axis=1).astype(np.float32) * 16 + 8
+    for _ in range(iters):
+        labels = np.argmin(((px[:, None, :] - centers[None, :, :]) ** 2).sum(axis=2), axis=1)
+        sizes = np.bincount(labels, minlength=len(centers))
+        sums = np.stack([np.bincount(labels, weights=px[:, c], minlength=len(centers)) for c in range(3)], axis=1)
+        moved = np.where(sizes[:, None] > 0, sums / np.maximum(sizes, 1)[:, None], centers)
+        if np.allclose(moved, centers, atol=0.5):
+            centers = moved
+            break
+        centers = moved
+    return centers, sizes / max(1, len(px))
+
+def dominant_color(path):
+    px = _pixels(path)
+    if not len(px):
+        return None
+    centers, share = _kmeans(px)
+    hi, lo = centers.max(axis=1), centers.min(axis=1)
+    sat = np.where(hi > 0, (hi - lo) / np.maximum(hi, 1), 0)
+    light = hi / 255.0
+    grey = sat < 0.18
+    whiteish = grey & (light > 0.85)
+    score = share * (0.2 + sat) * np.where(grey, 0.3, 1.0) * np.where(whiteish, 0.05, 1.0)
+    score = np.where(share > 0.02, score, 0)
+    return to_hex(centers[int(np.argmax(score))])
+
+def _work(path):
+    try:
+        return path, dominant_color(path), None
+    except Exception as e:  # unreadable/odd files are reported, not fatal
+        return path, None, str(e)
+
+def iter_logos(vendor_dir=VENDOR_DIR, league_map=LEAGUE_MAP):
+    # (league_code, logo path) for every logo in a mapped league folder
+    folders = {e["folder"]: e["league_code"] for e in json.loads(Path(league_map).read_text(encoding="utf-8"))}
+    for folder, code in sorted(folders.items()):
+        d = Path(vendor_dir) / folder
+        if not d.is_dir():
+            print(f"League folder missing: {d}")
+            continue
+        for p in sorted(d.iterdir()):
+            if p.suffix.lower() in (".png", ".jpg", ".jpeg", ".webp"):
+                yield code, p
+
+def extract_all(workers=None, cache_file=CACHE_FILE, teams=None):
+    # -> ({key(code, team_name): hex}, logos seen, logos extracted), cache-first
+    cache = json.loads(Path(cache_file).read_text(encoding="utf-8")) if Path(cache_file).exists() else {}
+    if cache.get("version") != ALGO_VERSION:
+        cache = {"version": ALGO_VERSION, "colors": {}}
+    # team_name for a logo file comes from teams.json logo_url when listed there
+    names = {}
+    for t in teams or []:
+        if t.get("logo_url"):
+            names[(REPO_ROOT / t["logo_url"]).resolve()] = t.get("team_name")
+
+    logos = list(iter_logos())
+    hashes = {p: sha256(p) for _, p in logos}
+    todo = sorted({p for p, h in hashes.items() if h not in cache["colors"]})
+    if todo:
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+            for path, hex_, err in pool.map(_work, todo, chunksize=8):
+                if err:
+                    print(f"Could not read {path}: {err}")
+                    continue
+                cache["colors"][hashes[path]] = hex_
+    live = set(hashes.values())
+    cache["colors"] = {h: c for h, c in cache["colors"].items() if h in live}
+    Path(cache_file).parent.mkdir(parents=True, exist_ok=True)
+    tmp = Path(str(cache_file) + ".tmp")
+    tmp.write_text(json.dumps(cache, indent=1, sort_keys=True), encoding="utf-8")
+    os.replace(tmp, cache_file)
+
+    out = {}
+    for code, p in logos:
+        hex_ = cache["colors"].get(hashes[p])
+        if hex_:
+            out[key(code, names.get(p.resolve()) or p.stem)] = hex_
+    return out, len(logos), len(todo)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Extract primary colors from every logo in logos1/vendor")
+    parser.add_argument("--out", default=str(OUT_FILE), help="Mapping to write (default: data/colors.generated.json)")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--cache", default=str(CACHE_FILE), help="Content-hash cache of extracted colors")
+    parser.add_argument("--write", action="store_true", help="Fill primary_color in teams.json where missing, invalid or #808080")
+    parser.add_argument("--force", action="store_true", help="With --write: overwrite every team's primary_color")
+    args = parser.parse_args(argv)
+
+    t0 = time.perf_counter()
+    teams = json.loads(TEAMS_FILE.read_text(encoding="utf-8"))
+    colors, logos, computed = extract_all(args.workers, args.cache, teams)
+    out = Path(args.out)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(dict(sorted(colors.items())), indent=2, ensure_ascii=False) + "\n", encoding="utf-8")
+
+    filled = 0
+    if args.write:
+        for t in teams:
+            current = (t.get("primary_color") or "").strip()
+            if not args.force and is_valid_hex(current) and current.upper() != PLACEHOLDER:
+                continue
+            new = colors.get(key(t.get("league_code"), t.get("team_name")))
+            if new and new != current:
+                t["primary_color"] = new
+                filled += 1
+        if filled:
+            tmp = TEAMS_FILE.with_name(TEAMS_FILE.name + ".tmp")
+            tmp.write_text(json.dumps(teams, indent=2, ensure_ascii=False) + "\n", encoding="utf-8")
+            os.replace(tmp, TEAMS_FILE)
+
+    print("Primary color extraction summary:")
+    print(f"- Logos: {logos} ({computed} extracted, {logos - computed} from cache)")
+    print(f"- Mapping written to: {out}")
+    if args.write:
+        print(f"- teams.json entries updated: {filled}")
+    print(f"- Took {time.perf_counter() - t0:.2f}s")
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+"""
+fake_wikimedia.py
+Local stand-in for the Wikimedia endpoints used by player_images.py and
+fetch_all_players.py, so the image pipeline can be measured and
+regression-tested offline.
+
+Serves, from one fixture:
+  /w/api.php                 wbsearchentities, wbgetentities, query&prop=imageinfo
+  /wiki/Special:FilePath/<f> image bytes (ETag / Last-Modified, answers 304)
+  /sparql                    roster query (VALUES ?club { ... }) and
+                             footballer label lookup (VALUES ?name { ... })
+
+The fixture is either generated from data/players.json + teams.json
+(default) or loaded from a JSON snapshot with the same shape
+({"entities", "search", "files", "rosters"}); --dump-fixture writes one.
+Latency and HTTP 429 injection are configurable.
+
+Example:
+python3 scripts/fake_wikimedia.py --port 8765 --latency 0.03 --error-rate 0.02
+"""
+import argparse
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, unquote, urlparse
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+PLAYERS_FILE = REPO_ROOT / "data" / "players.json"
+TEAMS_FILE = REPO_ROOT / "teams.json"
+
+def _norm(s):
+    return " ".join((s or "").strip().lower().split())
+
+def _claim(value, kind="string"):
+    if kind == "item":
+        return [{"mainsnak": {"datavalue": {"type": "wikibase-entityid", "value": {"id": value}}}}]
+    return [{"mainsnak": {"datavalue": {"type": "string", "value": value}}}]
+
+def synthetic_fixture(players, teams, league_code="EPL"):
+    # Every other player gets a P18 photo, the rest fall back to their club's P154 logo.
+    clubs = sorted({t["team_name"] for t in teams if (t.get("league_code") or "").upper() == league_code})
+    fx = {"entities": {}, "search": {}, "files": {}, "rosters": {}}
+    for i, club in enumerate(clubs):
+        qid = f"Q{900000 + i}"
+        logo = f"{club} logo.svg"
+        fx["entities"][qid] = {"id": qid, "lastrevid": 1, "labels": {"en": {"value": club}}, "claims": {"P154": _claim(logo)}}
+        fx["search"][_norm(club)] = qid
+        fx["files"][logo] = {"size": 6000, "timestamp": "2024-01-01T00:00:00Z", "artist": "Club", "license": "Public domain"}
+        fx["rosters"][qid] = []
+    club_qids = list(fx["rosters"])
+    for i, p in enumerate(players):
+        name = (p.get("name") or p.get("player_name") or "").strip()
+        if not name:
+            continue
+        qid = f"Q{100000 + i}"
+        claims = {}
+        if i % 2 == 0:
+            photo = f"{name}.jpg"
+            claims["P18"] = _claim(photo)
+            fx["files"][photo] = {"size": 40000 + (i * 37) % 20000, "timestamp": "2024-01-01T00:00:00Z",
+                                  "artist": "Photographer", "license": "CC BY-SA 4.0"}
+        if club_qids:
+            club = club_qids[i % len(club_qids)]
+            claims["P54"] = _claim(club, "item")
+            fx["rosters"][club].append(qid)
+        fx["entities"][qid] = {"id": qid, "lastrevid": 1, "labels": {"en": {"value": name}}, "claims": claims}
+        fx["search"].setdefault(_norm(name), qid)
+    return fx
+
+class FakeWikimedia:
+    """In-process server; start() returns the base URL, stats holds counters."""
+
+    def __init__(self, fixture, latency=0.0, error_rate=0.0, retry_after="0", seed=0, port=0):
+        self.fixture = fixture
+        self.latency = latency
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.port = port
+        self._rand = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = None
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.stats = {"requests": {}, "bytes": 0, "throttled": 0, "not_modified": 0}
+
+    def _count(self, endpoint, nbytes):
+        with self._lock:
+            self.stats["requests"][endpoint] = self.stats["requests"].get(endpoint, 0) + 1
+            self.stats["bytes"] += nbytes
+
+    def _throttle(self):
+        with self._lock:
+            hit = self.error_rate and self._rand.random() < self.error_rate
+            if hit:
+                self.stats["throttled"] += 1
+            return hit
+
+    # --- endpoint handlers: return (status, headers, body bytes) ---
+    def api(self, q):
+        action = q.get("action")
+        fx = self.fixture
+        if action == "wbsearchentities":
+            qid = fx["search"].get(_norm(q.get("search")))
+            data = {"search": [{"id": qid}] if qid else []}
+        elif action == "wbgetentities":
+            ents = {}
+            for qid in (q.get("ids") or "").split("|"):
+                ent = fx["entities"].get(qid)
+                if ent is None:
+                    ents[qid] = {"id": qid, "missing": ""}
+                elif q.get("props") == "info":
+                    ents[qid] = {"id": qid, "lastrevid": ent.get("lastrevid")}
+                else:
+                    ents[qid] = ent
+            data = {"entities": ents}
+        elif action == "query":
+            pages = {}
+            for n, title in enumerate((q.get("titles") or "").split("|")):
+                fn = title.split(":", 1)[-1]
+                f = fx["files"].get(fn)
+                if not f:
+                    pages[str(-n - 1)] = {"title": title, "missing": ""}
+                    continue
+                ext = {"Artist": {"value": f.get("artist")}, "LicenseShortName": {"value": f.get("license")}}
+                pages[str(n + 1)] = {"title": title, "imageinfo": [{
+                    "url": f"{self.base_url}/wiki/Special:FilePath/{fn}",
+                    "timestamp": f.get("timestamp"), "extmetadata": ext}]}
+            data = {"query": {"pages": pages}}
+        else:
+            data = {"error": {"code": "badvalue", "info": f"unsupported action {action}"}}
+        return 200, {"Content-Type": "application/json"}, json.dumps(data).encode()
+
+    def filepath(self, fn, headers):
+        f = self.fixture["files"].get(fn)
+        if not f:
+            return 404, {}, b""
+        etag = '"' + hashlib.md5((fn + str(f.get("timestamp"))).encode()).hexdigest() + '"'
+        if headers.get("If-None-Match") == etag:
+            with self._lock:
+                self.stats["not_modified"] += 1
+            return 304, {"ETag": etag}, b""
+        body = hashlib.sha256(fn.encode()).digest() * (int(f.get("size", 20000)) // 32 + 1)
+        return 200, {"Content-Type": "image/jpeg", "ETag": etag, "Last-Modified": "Mon, 01 Jan 2024 00:00:00 GMT"}, body[:int(f.get("size", 20000))]
+
+    def labels(self, query):
+        names = [json.loads(f'"{m}"') for m in re.findall(r'"((?:[^"\\]|\\.)*)"@en', query.split("VALUES ?name", 1)[1].split("}", 1)[0])]
+        clubs = set(re.findall(r"wd:(Q\d+)", query.split("VALUES ?club", 1)[1].split("}", 1)[0])) if "VALUES ?club" in query else set()
+        rows = []
+        for name in names:
+            for qid, ent in self.fixture["entities"].items():
+                if (ent.get("labels", {}).get("en") or {}).get("value") != name or "P154" in ent.get("claims", {}):
+                    continue
+                row = {"name": {"value": name}, "player": {"value": f"http://www.wikidata.org/entity/{qid}"}}
+                club = ent.get("claims", {}).get("P54", [{}])[0].get("mainsnak", {}).get("datavalue", {}).get("value", {}).get("id")
+                if club in clubs:
+                    row["club"] = {"value": f"http://www.wikidata.org/entity/{club}"}
+                rows.append(row)
+        return 200, {"Content-Type": "application/sparql-results+json"}, json.dumps({"results": {"bindings": rows}}).encode()
+
+    def sparql(self, query):
+        if "VALUES ?name" in query:
+            return self.labels(query)
+        clubs = re.findall(r"wd:(Q\d+)", query.split("VALUES", 1)[-1].split("}", 1)[0])
+        rows = []
+        for club in clubs:
+            for qid in self.fixture["rosters"].get(club, []):
+                ent = self.fixture["entities"].get(qid, {})
+                row = {"club": {"value": f"http://www.wikidata.org/entity/{club}"},
+                       "player": {"value": f"http://www.wikidata.org/entity/{qid}"},
+                       "playerLabel": {"value": (ent.get("labels", {}).get("en") or {}).get("value", qid)}}
+                rows.append(row)
+        return 200, {"Content-Type": "application/sparql-results+json"}, json.dumps({"results": {"bindings": rows}}).encode()
+
+    def handle(self, path, q, headers):
+        if path.endswith("/w/api.php"):
+            endpoint = q.get("action") or "api"
+            if endpoint == "wbgetentities" and q.get("props") == "info":
+                endpoint = "wbgetentities:info"
+            return endpoint, self.api(q)
+        if "/wiki/Special:FilePath/" in path:
+            return "filepath", self.filepath(unquote(path.split("/wiki/Special:FilePath/", 1)[1]), headers)
+        if path.endswith("/sparql"):
+            return "sparql", self.sparql(q.get("query") or "")
+        return "other", (404, {}, b"")
+
+    def start(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                u = urlparse(self.path)
+                q = {k: v[0] for k, v in parse_qs(u.query).items()}
+                if fake.latency:
+                    time.sleep(fake.latency)
+                if fake._throttle():
+                    endpoint, (status, headers, body) = "throttled", (429, {"Retry-After": fake.retry_after}, b"")
+                else:
+                    endpoint, (status, headers, body) = fake.handle(u.path, q, self.headers)
+                fake._count(endpoint, len(body))
+                self.send_response(status)
+                for k, v in headers.items():
+                    self.send_header(k, v)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", self.port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self.base_url
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def patch(self, player_images, fetch_all_players=None, rate=(1000, 1000)):
+        # Point the pipeline modules at this server (and give it its own rate limit).
+        base = self.base_url
+        player_images.WIKIDATA_API = f"{base}/w/api.php"
+        player_images.COMMONS_API = f"{base}/w/api.php"
+        player_images.COMMONS_FILEPATH = f"{base}/wiki/Special:FilePath/"
+        player_images._limiter.limits[urlparse(base).netloc] = rate
+        if fetch_all_players is not None:
+            fetch_all_players.SPARQL_ENDPOINT = f"{base}/sparql"
+
+def load_fixture(path=None, players_file=PLAYERS_FILE, teams_file=TEAMS_FILE):
+    if path:
+        return json.loads(Path(path).read_text(encoding="utf-8"))
+    players = json.loads(Path(players_file).read_text(encoding="utf-8"))
+    teams = json.loads(Path(teams_file).read_text(encoding="utf-8"))
+    return synthetic_fixture(players, teams)
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a fake Wikidata/Commons/SPARQL API for offline runs")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--fixture", help="JSON snapshot to serve (default: synthesized from data/players.json + teams.json)")
+    parser.add_argument("--dump-fixture", help="Write the fixture being served to this path and exit")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every response")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with HTTP 429")
+    parser.add_argument("--retry-after", default="0", help="Retry-After header sent with injected 429s")
+    args = parser.parse_args()
+
+    fixture = load_fixture(args.fixture)
+    if args.dump_fixture:
+        Path(args.dump_fixture).write_text(json.dumps(fixture, ensure_ascii=False, indent=1), encoding="utf-8")
+        print("Wrote fixture to", args.dump_fixture)
+        return
+    fake = FakeWikimedia(fixture, latency=args.latency, error_rate=args.error_rate, retry_after=args.retry_after, port=args.port)
+    base = fake.start()
+    print(f"Serving fake Wikimedia on {base} (Ctrl+C to stop)")
+    print(f"  WIKIDATA_API / COMMONS_API = {base}/w/api.php")
+    print(f"  SPARQL_ENDPOINT            = {base}/sparql")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        fake.stop()
+
+if __name__ == "__main__":
+    main()
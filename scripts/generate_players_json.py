@@ -4,17 +4,23 @@ generate_players_json.py
 Add an image_url field to each player in data/players.json by fuzzy-matching
 filenames in public/players (and public/). Leaves image_url as "" when no match.
 Creates a backup data/players.json.bak before writing.
+Players are streamed (JSON array or JSONL, see --input/--output) and the
+output is written as it goes, then renamed over the target.
 """
 import os
-import json
+import argparse
 import unicodedata
 import re
+import sys
+from itertools import chain, islice
 from pathlib import Path
 from shutil import copyfile
 
 REPO_ROOT = Path(__file__).resolve().parents[1]  # assumes script lives in scripts/
+sys.path.insert(0, str(REPO_ROOT))
+from jsonstream import RecordWriter, iter_records  # noqa: E402
+
 DATA_FILE = REPO_ROOT / "data" / "players.json"
-BACKUP_FILE = DATA_FILE.with_suffix(DATA_FILE.suffix + ".bak")
 PUBLIC_PLAYERS = REPO_ROOT / "public" / "players"
 PUBLIC_ROOT = REPO_ROOT / "public"
 
@@ -56,7 +62,87 @@ def build_filename_index():
             })
     return index
 
-def best_match(player: dict, index: list):
+class FilenameIndex:
+    """Inverted index over the normalized filenames of build_filename_index().
+
+    Substring lookups go through character n-gram postings (verified against
+    the real string, so results equal a linear scan); whole-token postings
+    drive the optional scored mode. Lookups are memoized, which makes the
+    club tier (shared by a whole squad) effectively precomputed.
+    """
+    def __init__(self, entries: list, n: int = 3):
+        self.entries = entries
+        self.n = n
+        self.grams = {}
+        self.tokens = {}
+        for i, f in enumerate(entries):
+            norm = f["norm"]
+            for g in {norm[j:j + n] for j in range(len(norm) - n + 1)}:
+                self.grams.setdefault(g, []).append(i)
+            for tok in set(norm.split()):
+                self.tokens.setdefault(tok, []).append(i)
+        self._memo = {}
+
+    def __len__(self):
+        return len(self.entries)
+
+    def candidates(self, q: str):
+        # ascending file positions that may contain q as a substring
+        if len(q) < self.n:
+            return range(len(self.entries))
+        postings = []
+        for g in {q[j:j + self.n] for j in range(len(q) - self.n + 1)}:
+            p = self.grams.get(g)
+            if not p:
+                return []
+            postings.append(p)
+        postings.sort(key=len)
+        cand = set(postings[0])
+        for p in postings[1:]:
+            cand.intersection_update(p)
+            if not cand:
+                return []
+        return sorted(cand)
+
+    def first_substring(self, q: str):
+        if q not in self._memo:
+            self._memo[q] = next((i for i in self.candidates(q) if q in self.entries[i]["norm"]), None)
+        return self._memo[q]
+
+    def first_all_tokens(self, tokens: list):
+        if not tokens:
+            return 0 if self.entries else None
+        cand = None
+        for tok in sorted(set(tokens), key=len, reverse=True):
+            c = self.candidates(tok)
+            cand = set(c) if cand is None else cand.intersection(c)
+            if not cand:
+                return None
+        return next((i for i in sorted(cand) if all(tok in self.entries[i]["norm"] for tok in tokens)), None)
+
+    def best_scored(self, tokens: list, norm_name: str, norm_club: str):
+        # rank files by whole-token overlap with the name (+ full-name and club bonuses)
+        scores = {}
+        for tok in set(tokens):
+            for i in self.tokens.get(tok, ()):
+                scores[i] = scores.get(i, 0) + 2
+        if not scores:
+            return None
+        club_toks = set(norm_club.split())
+        best = None
+        for i, score in scores.items():
+            norm = self.entries[i]["norm"]
+            if norm_name in norm:
+                score += 3
+            if club_toks and club_toks.issubset(norm.split()):
+                score += 1
+            if best is None or score > best[0] or (score == best[0] and i < best[1]):
+                best = (score, i)
+        return best[1]
+
+def best_match(player: dict, index, scored: bool = False):
+    if not isinstance(index, FilenameIndex):
+        index = FilenameIndex(index)
     name = (player.get("name") or player.get("player_name") or "").strip()
     if not name:
         return None
@@ -69,65 +155,74 @@ def best_match(player: dict, index: list):
     first_last = f"{tokens[0]} {last}" if len(tokens) >= 2 else norm_name
     norm_club = normalize_text(club)
 
-    # 1) full name substring
-    for f in index:
-        if norm_name in f["norm"]:
-            return f["src"]
-    # 2) last name substring
-    if last:
-        for f in index:
-            if last in f["norm"]:
-                return f["src"]
-    # 3) first+last
-    for f in index:
-        if first_last in f["norm"]:
-            return f["src"]
-    # 4) all tokens present (any order)
-    for f in index:
-        if all(tok in f["norm"] for tok in tokens):
-            return f["src"]
-    # 5) club substring
-    if norm_club:
-        for f in index:
-            if norm_club in f["norm"]:
-                return f["src"]
+    if scored:
+        i = index.best_scored(tokens, norm_name, norm_club)
+        if i is not None:
+            return index.entries[i]["src"]
+
+    def tiers():
+        # 1) full name substring
+        yield index.first_substring(norm_name)
+        # 2) last name substring
+        if last:
+            yield index.first_substring(last)
+        # 3) first+last
+        yield index.first_substring(first_last)
+        # 4) all tokens present (any order)
+        yield index.first_all_tokens(tokens)
+        # 5) club substring
+        if norm_club:
+            yield index.first_substring(norm_club)
+
+    for i in tiers():
+        if i is not None:
+            return index.entries[i]["src"]
     return None
 
-def main():
-    if not DATA_FILE.exists():
-        print(f"data/players.json not found at {DATA_FILE}. Aborting.")
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fill image_url in data/players.json from local image files")
+    parser.add_argument("--scored", action="store_true",
+                        help="Prefer the file sharing the most whole name tokens before falling back to the substring tiers")
+    parser.add_argument("--input", default=str(DATA_FILE), help="Players to read (JSON array or .jsonl)")
+    parser.add_argument("--output", help="Where to write (default: overwrite --input; .jsonl writes JSONL)")
+    args = parser.parse_args(argv)
+    scored = args.scored
+    src = Path(args.input)
+    dest = Path(args.output) if args.output else src
+
+    if not src.exists():
+        print(f"{src.name} not found at {src}. Aborting.")
         return
 
-    # load players
-    with DATA_FILE.open("r", encoding="utf-8") as fh:
-        data = json.load(fh)
-    if not isinstance(data, list):
-        print("Expected players.json to contain a JSON array.")
+    records = iter_records(src)
+    try:
+        head = list(islice(records, 1))  # reads far enough to check the top level
+    except ValueError as e:
+        print(e)
         return
 
     # backup
-    copyfile(DATA_FILE, BACKUP_FILE)
-    print(f"Backup written to {BACKUP_FILE}")
+    if dest == src:
+        backup = src.with_suffix(src.suffix + ".bak")
+        copyfile(src, backup)
+        print(f"Backup written to {backup}")
 
-    index = build_filename_index()
+    index = FilenameIndex(build_filename_index())
     print(f"Scanned {len(index)} candidate image files")
 
-    updated = []
     changed = 0
-    for p in data:
-        match = best_match(p, index)
-        image_url = match or ""  # empty string when no confident match (per your choice)
-        if p.get("image_url") != image_url:
-            changed += 1
-        newp = dict(p)
-        newp["image_url"] = image_url
-        updated.append(newp)
-
-    # write back
-    with DATA_FILE.open("w", encoding="utf-8") as fh:
-        json.dump(updated, fh, indent=2, ensure_ascii=False)
-        fh.write("\n")
-    print(f"Updated {changed} entries in {DATA_FILE}")
+    # stream players through; the target is replaced only once everything is written
+    with RecordWriter(dest) as out:
+        for p in chain(head, records):
+            if not isinstance(p, dict):
+                raise ValueError(f"Expected {src.name} to contain player objects, got {type(p).__name__}")
+            match = best_match(p, index, scored=scored)
+            image_url = match or ""  # empty string when no confident match (per your choice)
+            if p.get("image_url") != image_url:
+                changed += 1
+            p["image_url"] = image_url
+            out.write(p)
+    print(f"Updated {changed} entries in {dest}")
 
 if __name__ == "__main__":
     main()